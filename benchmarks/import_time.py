@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Guards the startup time of the command line interface.
+Fails if a command imports modules which belong to another feature or exceeds the time budget.
+
+    $ python3 benchmarks/import_time.py
+"""
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent.parent
+# Modules which are only allowed for the given feature
+HEAVY_MODULES = ['tesserocr', 'tqdm', 'numpy', 'ftplib', 'zipfile', 'http.server',
+                 'lib.revaluation', 'lib.ocrworker', 'lib.unicodetools', 'lib.service']
+COMMANDS = {'--help': ['--help'],
+            'evaluate --help': ['evaluate', '--help'],
+            'evaluate': ['evaluate', str(APP.joinpath('docs/test')), '-g', 'OCR-D-1']}
+# Maximum median wall time per command in seconds
+BUDGET = 0.5
+RUNS = 5
+
+
+def imported_modules(args) -> set:
+    """
+    Returns the modules imported by a command
+    :param args: command line arguments
+    :return:
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', str(APP.joinpath('gtreval.py')), *args],
+                          cwd=APP, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return {line.split('|')[-1].strip() for line in proc.stderr.splitlines() if line.startswith('import time:')}
+
+
+def wall_time(args) -> float:
+    """
+    Returns the median wall time of a command
+    :param args: command line arguments
+    :return:
+    """
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(APP.joinpath('gtreval.py')), *args],
+                       cwd=APP, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main() -> int:
+    failed = False
+    for name, args in COMMANDS.items():
+        heavy = sorted(set(HEAVY_MODULES).intersection(imported_modules(args)))
+        median = wall_time(args)
+        status = 'ok'
+        if heavy or median > BUDGET:
+            status, failed = 'FAILED', True
+        print(f"{name:<20} {median * 1000:8.1f} ms  {status}{' imports ' + ', '.join(heavy) if heavy else ''}")
+    return int(failed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,11 @@
 #!/usr/bin/env python3
-import io
 import unicodedata
-from collections import defaultdict, OrderedDict, Counter
+from collections import defaultdict, OrderedDict
 
 import click
-from tqdm import tqdm
 
-from lib.editing import substitutiontext
-from lib.evaluation import validate_with_guidelines, categorize, missing_unicode
-from lib.functools import get_defaultdict
-from lib.io import create_json, set_output, write_subcounter
-from lib.processhandler import Revaluatehandler, Evaluatehandler
-from lib.report import summarize, create_report
-from lib.revaluation import revaluate_ocr
-from lib.unicodetools import load_ucd
+# The command specific modules are imported in the commands,
+# so e.g. evaluate never loads tesseract and '--help' starts fast.
 
 
 @click.group()
@@ -21,6 +13,49 @@ def cli():
     pass
 
 
+def parse_shard(ctx, param, value):
+    """
+    Parses the shard option 'i/N' into a tuple (i, N)
+    """
+    if not value:
+        return None
+    try:
+        shard, shards = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise click.BadParameter("shard needs to be given as 'i/N', e.g. '1/4'")
+    if not 1 <= shard <= shards:
+        raise click.BadParameter(f"shard number needs to be between 1 and {shards}")
+    return shard, shards
+
+
+shard_options = [click.option('--shard', callback=parse_shard,
+                              help="Process only the shard 'i/N' of the input files (i from 1 to N), "
+                                   "N invocations cover every file exactly once"),
+                 click.option('--sharding', default='size', type=click.Choice(['size', 'hash']),
+                              help='Partition the files by balanced byte volume or by a stable path hash')]
+
+
+def parse_configs(ctx, param, value):
+    """
+    Parses the ocr configurations in the form LANG:PSM
+    """
+    configs = []
+    for config in value:
+        lang, _, psm = config.rpartition(':')
+        if not lang or not psm.isdigit() or not 0 <= int(psm) <= 14:
+            raise click.BadParameter(f"'{config}' is not in the form LANG:PSM, e.g. deu:7")
+        configs.append((lang, int(psm)))
+    return list(dict.fromkeys(configs))
+
+
+def add_options(options):
+    def wrapper(func):
+        for option in reversed(options):
+            func = option(func)
+        return func
+    return wrapper
+
+
 # Command line arguments.
 @cli.command()
 @click.argument('fpaths', nargs=-1, type=click.Path(exists=True))
@@ -44,77 +79,315 @@ def cli():
               default=['name'], type=click.Choice(['name', 'code']), multiple=True)
 @click.option('-g', '--guideline', help="Guidelines for the automatic revaluation",
               type=click.Choice(['OCR-D-1', 'OCR-D-2', 'OCR-D-3', 'CUSTOM']))
-@click.option('-t', '--textnormalization', help="Unicode text normalization", default='NFC',
-              type=click.Choice(['NFC', 'NFKC', 'NFD', 'NFKD']))
+@click.option('-t', '--textnormalization', help="Unicode text normalization, multiple normalizations are "
+                                              "evaluated from a single read and reported with their differences",
+              default=['NFC'], type=click.Choice(['NFC', 'NFKC', 'NFD', 'NFKD']), multiple=True)
+@click.option('--input-format', default='txt', type=click.Choice(['txt', 'xml', 'all']),
+              help='Reads the text files, the PAGE-XML and ALTO files (*.xml) or both in the input directories')
+@click.option('-e', '--engine', help="Counting engine for the glyph statistics, numpy processes the text as "
+                                     "codepoint arrays in large batches", default='python',
+              type=click.Choice(['python', 'numpy']))
+@click.option('--snapshot', type=click.Path(), help='filename of a mergeable statistics snapshot '
+                                                    '(compressed if it ends with .gz)')
+@click.option('--index', type=click.Path(dir_okay=False),
+              help='filename of an inverted glyph index (sqlite) for the query command')
+@click.option('--store', type=click.Path(dir_okay=False),
+              help='filename of a sqlite database, which stores the lines, glyph counts per file and guideline '
+                   'violations instead of the memory, e.g. for the json output of large datasets')
+@click.option('--ngrams', type=click.IntRange(2, 10), multiple=True,
+              help='Counts the character n-grams of this size, e.g. --ngrams 2 --ngrams 3')
+@click.option('--ngram-mode', default='exact', type=click.Choice(['exact', 'sketch']),
+              help='Counts all n-grams exactly or only the most common ones with a Count-Min sketch in bounded '
+                   'memory for large datasets')
+@click.option('--ngram-top', default=50, type=click.IntRange(0),
+              help='Number of reported n-grams per size (0 reports all n-grams in the exact mode)')
+@click.option('--chunksize', type=click.IntRange(1),
+              help='Files larger than this size (MiB) are memory-mapped and counted in chunks of this size, '
+                   'their lines are not kept for the line-level json output and the index')
+@click.option('--jobs', default=1, type=click.IntRange(1), help='Number of processes for the chunks of large files')
+@click.option('--per-dataset', default=False, is_flag=True,
+              help='Reports the statistics of every input path next to the combined statistics')
+@click.option('--duplicates', default=False, is_flag=True,
+              help='Finds exact and near-duplicate lines within and across the input paths')
+@click.option('--similarity', default=0.8, type=click.FloatRange(0, 1),
+              help='Minimum estimated similarity (Jaccard of the character 3-grams) of near-duplicate lines, '
+                   '1 finds only exact duplicates')
+@click.option('--sample', type=click.IntRange(1),
+              help='Estimates the statistics with confidence intervals from a random sample of this size')
+@click.option('--sample-unit', default='files', type=click.Choice(['files', 'lines']),
+              help='Samples files (only the sampled files are read) or lines')
+@click.option('--seed', default=0, type=click.INT, help='Seed of the random sample')
+@add_options(shard_options)
+@click.option('-w', '--watch', default=False, is_flag=True,
+              help='Keep watching the input paths and update the report when text files change')
+@click.option('--interval', default=0.5, type=click.FLOAT, help='Polling interval of the watch mode in seconds')
 @click.option('-l', '--log', default=False, is_flag=True, help='Logs process information')
 @click.option('-v', '--verbose', default=False, is_flag=True, help='Print more process information')
 def evaluate(fpaths, output, json, custom_categories, statistical_categories, missing_unicodes,
-             addinfo, guideline, textnormalization, log, verbose):
+             addinfo, guideline, textnormalization, input_format, engine, snapshot, index, store, ngrams,
+             ngram_mode, ngram_top, chunksize, jobs, per_dataset, duplicates, similarity, sample, sample_unit, seed, shard,
+             sharding, watch, interval, log, verbose):
     """
     Reads text files, evaluate the unicode character and creates a report
     :return:
     """
+    from lib.analysis import analyse
+    from lib.counting import get_glyphcounter
+    from lib.evaluation import merge_regex_violations
+    from lib.functools import get_defaultdict
+    from lib.io import create_json, set_output, read_input_textlines, normalize_textlines
+    from lib.linestore import Linestore
+    from lib.processhandler import Evaluatehandler
+    from lib.report import create_report, create_normalization_report
+
     evalu = Evaluatehandler(fpaths, output, json, custom_categories, statistical_categories,
-                            addinfo, guideline, textnormalization, log, verbose)
+                            addinfo, guideline, textnormalization, engine, log, verbose, shard, sharding, input_format)
+
+    if watch:
+        if input_format != 'txt' or len(evalu.textnormalizations) > 1 or shard or per_dataset or ngrams or sample \
+                or store or duplicates or snapshot or index or chunksize:
+            raise click.UsageError("--watch can't be combined with --input-format xml/all, multiple text "
+                                   "normalizations, --shard, --per-dataset, --ngrams, --sample, --store, "
+                                   "--duplicates, --snapshot, --index or --chunksize")
+        from lib.watch import watch_evaluation
+        watch_evaluation(fpaths, evalu, missing_unicodes, interval)
+        return
+
+    if ngram_mode == 'sketch' and not ngram_top:
+        raise click.BadParameter("the sketch mode needs a number of reported n-grams", param_hint='--ngram-top')
 
-    results = defaultdict(OrderedDict)
+    if sample:
+        if snapshot or index or store or ngrams or per_dataset or duplicates or len(evalu.textnormalizations) > 1:
+            raise click.UsageError("--sample can't be combined with --snapshot, --index, --store, --ngrams, "
+                                   "--per-dataset, --duplicates or multiple text normalizations")
+        from lib.sampling import evaluate_sample
+        ucd = None
+        if missing_unicodes:
+            from lib.unicodetools import load_ucd
+            ucd = load_ucd(update=True)
+        results = evaluate_sample(evalu, sample, sample_unit, seed, missing_unicodes, ucd)
+        evalu.sample = results['sample']
+        set_output(evalu)
+        create_report(results, evalu)
+        if evalu.json:
+            create_json(results, evalu.output)
+        return
 
-    # Read all files
+    results = OrderedDict()
+    glyphcounters = {}
+    ngramcounters = {}
+    for textnormalization in evalu.textnormalizations:
+        results[textnormalization] = defaultdict(OrderedDict)
+        if store:
+            # Every text normalization gets its own database, e.g. lines.NFD.sqlite
+            from lib.linedatabase import Linedatabase, linedatabase_name
+            results[textnormalization]['single'] = Linedatabase(
+                linedatabase_name(store, textnormalization, len(evalu.textnormalizations) > 1), textnormalization)
+        else:
+            results[textnormalization]['single'] = Linestore()
+        glyphcounters[textnormalization] = get_glyphcounter(evalu.engine)
+        if ngrams:
+            from lib.ngrams import Ngramcounter
+            ngramcounters[textnormalization] = Ngramcounter(ngrams, ngram_mode, ngram_top)
+
+    # Large files are counted in chunks, only their counts and regex violations are kept
+    chunkreader = None
+    chunkviolations = {textnormalization: {} for textnormalization in results}
+    chunklines = {textnormalization: 0 for textnormalization in results}
+    if chunksize:
+        from lib.chunks import Chunkreader
+        guidelines = evalu.guidelines if snapshot else {evalu.guideline: evalu.guidelines[evalu.guideline]} \
+            if evalu.guideline in (evalu.guidelines or {}) else {}
+        chunkreader = Chunkreader(evalu.textnormalizations, evalu.engine, guidelines,
+                                  (ngrams, ngram_mode, ngram_top) if ngrams else None, chunksize * 2 ** 20, jobs)
+
+    # Read all files once, only the normalization is done for every text normalization
     for pidx, (fpath, fnames) in enumerate(evalu.files.items()):
-        get_defaultdict(results['path_indexes'], f"{pidx}")
-        results['path_indexes'][f"{pidx}"] = fpath.absolute()
+        for result in results.values():
+            get_defaultdict(result['path_indexes'], f"{pidx}")
+            result['path_indexes'][f"{pidx}"] = fpath.absolute()
+        # Every dataset gets its own glyphcounter, which is merged into the combined one afterwards
+        datasetcounters = {textnormalization: get_glyphcounter(evalu.engine) for textnormalization in results} \
+            if per_dataset else glyphcounters
         for fname in fnames:
             evalu.orig_fname = fname
-            with io.open(str(fname.resolve()), 'r', encoding='utf-8') as fin:
+            if chunkreader and fname.suffix.lower() != '.xml' and chunkreader.is_large(fname):
                 try:
-                    text = unicodedata.normalize(evalu.textnormalization, fin.read().strip())
-                    for idx, textline in enumerate(text.split('\n')):
-                        get_defaultdict(results['single'], f'{pidx}:'+fname.name+f'_{idx}')
-                        results['single'][f'{pidx}:'+fname.name+f'_{idx}']['text'] = textline
+                    chunkcounts = chunkreader.read(fname)
                 except UnicodeDecodeError:
                     if evalu.verbose:
                         print(f"{fname.name} (ignored)")
                     continue
+                for textnormalization, (glyphcounter, ngramcounter, violations, lines) in chunkcounts.items():
+                    datasetcounters[textnormalization].merge(glyphcounter)
+                    if ngramcounters:
+                        ngramcounters[textnormalization].merge(ngramcounter)
+                    chunkviolations[textnormalization][pidx] = merge_regex_violations(
+                        chunkviolations[textnormalization].get(pidx, {}), violations)
+                    chunklines[textnormalization] += lines
+                continue
+            try:
+                lineids, rawlines = read_input_textlines(fname)
+            except ValueError:
+                if evalu.verbose:
+                    print(f"{fname.name} (ignored)")
+                continue
+            for textnormalization, result in results.items():
+                textlines = normalize_textlines(rawlines, textnormalization)
+                result['single'].add_file(pidx, fname.absolute(), textlines, lineids)
+                datasetcounters[textnormalization].update(textlines)
+                if ngramcounters:
+                    ngramcounters[textnormalization].update(textlines)
+        if per_dataset:
+            for textnormalization, result in results.items():
+                get_defaultdict(result, 'datasets')
+                dataset = result['datasets'][f"{pidx}"] = defaultdict(OrderedDict)
+                dataset['path_indexes'][f"{pidx}"] = fpath.absolute()
+                get_defaultdict(dataset, 'combined')
+                datasetcounters[textnormalization].to_results(dataset['combined']['all'])
+                glyphcounters[textnormalization].merge(datasetcounters[textnormalization])
+
+    if chunkreader:
+        chunkreader.close()
 
     # Analyse the combined statistics
-    get_defaultdict(results, 'combined')
-    res_all = results['combined']['all']
-    res_all['glyph'] = Counter(
-        ''.join([text for fileinfo in list(results['single'].values()) for text in fileinfo.values()]))
-    res_all['combined glyph'] = Counter(
-        [text[idx - 1] + char for fileinfo in list(results['single'].values()) for text in fileinfo.values()
-         for idx, char in enumerate(text) if ord(char) in [*list(range(768, 879 + 1)),
-                                                           *list(range(6832, 6848 + 1)),
-                                                           *list(range(7616, 7664 + 1)),
-                                                           *list(range(8400, 8432 + 1)),
-                                                           *list(range(65056, 65071 + 1))] and idx != 0])
-    res_all['codepoints'] = {ord(glyph): val for glyph, val in
-                                                results['combined']['all']['glyph'].items()}
-    # Categorize the combined statistics with standard categories
-    categorize(results, category='combined')
-
-    # Categorize the combined statistics with customized categories
-    for category in evalu.custom_categories:
-        categorize(results, category=category)
-
-    # Find missing unicode glyphs
+    for textnormalization, result in results.items():
+        get_defaultdict(result, 'combined')
+        glyphcounters[textnormalization].to_results(result['combined']['all'])
+        if ngramcounters:
+            ngramcounters[textnormalization].to_results(result['combined'])
+        if chunkviolations[textnormalization]:
+            result['regex violations'] = merge_regex_violations(*chunkviolations[textnormalization].values())
+
+    # Store the mergeable statistics
+    if snapshot:
+        from lib.evaluation import count_regex_violations
+        from lib.snapshot import create_snapshot, write_snapshot
+        result = results[evalu.textnormalization]
+        regex_violations = merge_regex_violations(count_regex_violations(result['single'].textlines(),
+                                                                         evalu.guidelines),
+                                                  result.get('regex violations', {}))
+        snapshotdata = create_snapshot(result, evalu, regex_violations)
+        snapshotdata['lines'] += chunklines[evalu.textnormalization]
+        write_snapshot(snapshotdata, snapshot)
+
+    # Store the locations of the glyphs
+    if index:
+        from lib.glyphindex import create_glyphindex
+        create_glyphindex(index, results[evalu.textnormalization]['single'], evalu.textnormalization)
+
+    # Find the duplicate lines, the lines of chunked files are not kept and therefore not compared
+    if duplicates:
+        from lib.duplicates import find_duplicates
+        result = results[evalu.textnormalization]
+        result['duplicates'] = find_duplicates(result['single'], result['path_indexes'], similarity)
+
+    ucd = None
     if missing_unicodes:
+        from lib.unicodetools import load_ucd
         ucd = load_ucd(update=True)
-        for missing_unicode_profile in missing_unicodes:
-            missing_unicode(results, evalu, ucd, profile=missing_unicode_profile)
+    for textnormalization, result in results.items():
+        analyse(result, evalu, missing_unicodes, ucd)
+        # The datasets provide no textlines, so their regex violations are counted from the stored lines
+        for pidx, dataset in result.get('datasets', {}).items():
+            if evalu.guideline in (evalu.guidelines or {}):
+                from lib.evaluation import count_regex_violations
+                dataset['regex violations'] = merge_regex_violations(
+                    count_regex_violations(result['single'].textlines(int(pidx)),
+                                           {evalu.guideline: evalu.guidelines[evalu.guideline]}),
+                    chunkviolations[textnormalization].get(int(pidx), {}))
+            analyse(dataset, evalu, missing_unicodes, ucd)
+
+    # Result output
+    set_output(evalu)
+    if len(results) > 1:
+        create_normalization_report(results, evalu)
+        if evalu.json:
+            create_json(results, evalu.output)
+    else:
+        create_report(results[evalu.textnormalization], evalu)
+        if evalu.json:
+            create_json(results[evalu.textnormalization], evalu.output)
+    if store:
+        for result in results.values():
+            result['single'].close()
+    return
+
+
+@cli.command()
+@click.argument('index', type=click.Path(exists=True, dir_okay=False))
+@click.argument('glyphs', nargs=-1)
+@click.option('-g', '--guideline', help="Looks up the violations of the guideline",
+              type=click.Choice(['OCR-D-1', 'OCR-D-2', 'OCR-D-3', 'CUSTOM']))
+@click.option('-n', '--limit', default=0, type=click.IntRange(0),
+              help='Maximum number of locations per query (0 prints all)')
+@click.option('--count', default=False, is_flag=True, help='Prints only the number of occurrences')
+@click.option('-j', '--json', default=False, is_flag=True, help='Prints the locations as json')
+def query(index, glyphs, guideline, limit, count, json):
+    """
+    Looks up glyphs (e.g. ſ, U+E5DC, U+E000-U+F8FF, aͤ) and guideline violations in a glyph index,
+    which was created by 'evaluate --index'.
+    """
+    from lib.glyphindex import query_glyphindex, print_query
+    from lib.settings import load_profiles
+
+    guidelines = load_profiles("profiles/evaluate/guidelines") if guideline else None
+    try:
+        results = query_glyphindex(index, glyphs, guideline, guidelines, limit)
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+    if json:
+        import json as jsonlib
+        print(jsonlib.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_query(results, count)
+
 
-    # Validate the text against the guidelines
-    if guideline:
-        validate_with_guidelines(results, evalu)
+@cli.command()
+@click.argument('snapshots', nargs=-1, type=click.Path(exists=True))
+@click.option('-o', '--output', type=click.Path(), help='filename of the output report, \
+                        if none is given the result is printed to stdout')
+@click.option('-j', '--json', default=False, is_flag=True,
+              help='will also output the all results as json file')
+@click.option('-c', '--custom_categories', help='Customized unicodedata categories',
+              default=[''], multiple=True)
+@click.option('-s', '--statistical-categories',
+              help='Customized unicodedata categories. "all" prints information about '
+                   'all unicode glyphs ordered by occurence. The other options ar "L" for Letter, '
+                   '"Z" for Separator, "P" for Punctuation, "M" for Mark,'
+                   '"N" for Number, "S" for Symbol,i "C" for Other',
+              default=['all'], type=click.Choice(['L', 'M', 'N', 'P', 'S', 'Z', 'C', 'all']), multiple=True)
+@click.option('-m', '--missing-unicodes',
+              help="Print missing unicodes in the dataset by either a profile from profiles/evaluate/missing_unicode, "
+                   "a unicode rang e.g. , '0x0000-0x007F, 0x0100-0x017F'",
+              type=click.STRING, multiple=True)
+@click.option('-a', '--addinfo', help="Add information, such as unicode name and/or code to output",
+              default=['name'], type=click.Choice(['name', 'code']), multiple=True)
+@click.option('-g', '--guideline', help="Guidelines for the automatic revaluation",
+              type=click.Choice(['OCR-D-1', 'OCR-D-2', 'OCR-D-3', 'CUSTOM']))
+@click.option('-t', '--textnormalization', help="Unicode text normalization of the snapshots", default='NFC',
+              type=click.Choice(['NFC', 'NFKC', 'NFD', 'NFKD']))
+@click.option('-v', '--verbose', default=False, is_flag=True, help='Print more process information')
+def merge(snapshots, output, json, custom_categories, statistical_categories, missing_unicodes,
+          addinfo, guideline, textnormalization, verbose):
+    """
+    Merges statistics snapshots of multiple evaluations and creates a report
+    """
+    from lib.analysis import analyse
+    from lib.io import create_json, set_output
+    from lib.processhandler import Mergehandler
+    from lib.report import create_report
+    from lib.snapshot import load_snapshot, merge_snapshots
 
-    # Summarize category data
-    for section in ['cat', 'usr']:
-        if section in results['combined'].keys():
-            for key in set(results['combined'][section].keys()):
-                summarize(results['combined'][section], key)
+    evalu = Mergehandler(snapshots, output, json, custom_categories, statistical_categories,
+                         addinfo, guideline, textnormalization, verbose)
+    try:
+        results = merge_snapshots((load_snapshot(snapshot) for snapshot in evalu.snapshots), evalu)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint='SNAPSHOTS')
+    evalu.set_files(results['path_indexes'])
 
-    # Don't need codepoints information anymore TODO: Rework this!
-    del res_all['codepoints']
+    analyse(results, evalu, missing_unicodes)
 
     # Result output
     set_output(evalu)
@@ -124,6 +397,74 @@ def evaluate(fpaths, output, json, custom_categories, statistical_categories, mi
     return
 
 
+@cli.command()
+@click.argument('old', type=click.Path(exists=True, dir_okay=False))
+@click.argument('new', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', type=click.Path(), help='filename of the output report, \
+                        if none is given the result is printed to stdout')
+@click.option('-j', '--json', default=False, is_flag=True,
+              help='will also output the differences as json file')
+@click.option('-c', '--custom_categories', help='Customized unicodedata categories (only used for snapshots)',
+              default=[''], multiple=True)
+@click.option('-m', '--missing-unicodes',
+              help="Missing unicode profiles (only used for snapshots)", type=click.STRING, multiple=True)
+@click.option('-a', '--addinfo', help="Add information, such as unicode name and/or code to output",
+              default=['name'], type=click.Choice(['name', 'code']), multiple=True)
+@click.option('-g', '--guideline', help="Guideline for the violations (only used for snapshots)",
+              type=click.Choice(['OCR-D-1', 'OCR-D-2', 'OCR-D-3', 'CUSTOM']))
+@click.option('-t', '--textnormalization', help="Unicode text normalization of the snapshots", default='NFC',
+              type=click.Choice(['NFC', 'NFKC', 'NFD', 'NFKD']))
+@click.option('-v', '--verbose', default=False, is_flag=True, help='Print more process information')
+def compare(old, new, output, json, custom_categories, missing_unicodes, addinfo, guideline,
+            textnormalization, verbose):
+    """
+    Compares two stored evaluation results (json results of 'evaluate -j' or snapshots) and reports
+    only the differences of the glyphs, combined glyphs, category sums, guideline violations and missing unicodes
+    """
+    from lib.compare import load_results, compare_results, create_compare_report
+    from lib.io import create_json, set_output
+    from lib.processhandler import Mergehandler
+
+    evalu = Mergehandler((old, new), output, json, custom_categories, ['all'],
+                         addinfo, guideline, textnormalization, verbose)
+    try:
+        deltas = compare_results(load_results(old, evalu, missing_unicodes),
+                                 load_results(new, evalu, missing_unicodes))
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    # Result output
+    set_output(evalu)
+    create_compare_report(deltas, evalu, old, new)
+    if evalu.json:
+        create_json(deltas, evalu.output)
+    return
+
+
+@cli.command()
+@click.option('--host', default='127.0.0.1', help='Host of the http endpoint')
+@click.option('--port', default=8080, type=click.IntRange(0, 65535), help='Port of the http endpoint')
+@click.option('--socket', type=click.Path(), help='Serve on a unix socket instead of the http endpoint')
+@click.option('-g', '--guideline', help="Default guideline for the evaluation requests",
+              type=click.Choice(['OCR-D-1', 'OCR-D-2', 'OCR-D-3', 'CUSTOM']))
+@click.option('-t', '--textnormalization', help="Default unicode text normalization", default='NFC',
+              type=click.Choice(['NFC', 'NFKC', 'NFD', 'NFKD']))
+@click.option('--no-ucd', default=False, is_flag=True,
+              help="Don't preload the unicode database (it gets loaded with the first missing unicode request)")
+@click.option('-v', '--verbose', default=False, is_flag=True, help='Print more process information')
+def serve(host, port, socket, guideline, textnormalization, no_ucd, verbose):
+    """
+    Serves evaluation requests with warm profiles and unicode database.
+    POST /evaluate expects json with 'text' or 'lines' and the optional keys 'guideline',
+    'custom_categories', 'missing_unicodes' and 'textnormalization'. POST /reload reloads the profiles,
+    which are also reloaded automatically if the profile files change.
+    """
+    from lib.service import Evaluationservice, serve as serve_requests
+
+    service = Evaluationservice(guideline, textnormalization, not no_ucd, verbose)
+    serve_requests(service, host, port, socket)
+
+
 @cli.command()
 @click.argument('fpaths', nargs=-1, type=click.Path(exists=True))
 @click.option('-o', '--output', type=click.Path(), help='filename of the output report, \
@@ -131,6 +472,13 @@ def evaluate(fpaths, output, json, custom_categories, statistical_categories, mi
 @click.option('--dry-run', default=False, is_flag=True, help="Don't store the ground truth text changes")
 @click.option('-l', '--lang', default='eng', help='Tesseract language model')
 @click.option('--psm', default=13, type=click.IntRange(0, 14), help='Tesseract pagesegementation mode')
+@click.option('--config', 'configs', multiple=True, callback=parse_configs,
+              help='OCR configuration LANG:PSM, multiple configurations are compared on a single image load. '
+                   'The first configuration revaluates the ground truth, default: --lang and --psm')
+@click.option('--timeout', default=60, type=click.FloatRange(0),
+              help='Seconds per image until the OCR engine gets killed and replaced (0 disables the limit)')
+@click.option('--recycle', default=1000, type=click.IntRange(0),
+              help='Number of images after which the OCR engine gets replaced (0 disables the recycling)')
 @click.option('-d', '--diffratio', help='logs all ratios which are beyond the given ratio (0-1)', type=click.FLOAT,
               default=0)
 @click.option('-g', '--guideline', help='Guidelines for the automatic revaluation', type=click.STRING,
@@ -139,41 +487,88 @@ def evaluate(fpaths, output, json, custom_categories, statistical_categories, mi
               type=click.Choice(['NFC', 'NFKC', 'NFD', 'NFKD']))
 @click.option('--delete-suspicous', default=False, is_flag=True,
               help='Delete files which are lower than the diffratio with at least five characters')
+@add_options(shard_options)
+@click.option('--patch', type=click.Path(dir_okay=False),
+              help="Write the ground truth changes as unified diff to the patch file instead of changing the files")
+@click.option('--fsync/--no-fsync', default=True, help='Flush the written ground truth files to the disk')
+@click.option('--journal', type=click.Path(dir_okay=False), help='Journal of the processed files, '
+              'default: revaluate.journal.jsonl (revaluate.shardXofY.journal.jsonl for shards), '
+                   'dry runs only read it')
+@click.option('--resume', default=False, is_flag=True,
+              help='Skip the files of the journal, which were completed and not changed since')
 @click.option('-l', '--log', default=False, is_flag=True, help='Logs process information')
 @click.option('-v', '--verbose', default=False, is_flag=True, help='Print more process information')
 def revaluate(fpaths, output, dry_run,
-              lang, psm, diffratio, guideline,
-              textnormalization, delete_suspicous, log, verbose):
+              lang, psm, configs, timeout, recycle, diffratio, guideline,
+              textnormalization, delete_suspicous, shard, sharding, patch, fsync, journal, resume, log, verbose):
     """
     Revaluate the ground truth texts for the given text files.
     """
+    from tqdm import tqdm
+
+    from lib.editing import substitutiontext
+    from lib.io import write_subcounter, write_configsummary
+    from lib.journal import Revaluationjournal, journal_filename
+    from lib.ocrworker import Ocrworker
+    from lib.processhandler import Revaluatehandler
+    from lib.revaluation import revaluate_ocr
+    from lib.writeback import Writeback
+
     reval = Revaluatehandler(fpaths, output, lang, psm,
                              diffratio, guideline, textnormalization,
-                             substitutiontext, delete_suspicous, log, verbose)
+                             substitutiontext, delete_suspicous, log, verbose, shard, sharding, configs)
+    journal = Revaluationjournal(journal or journal_filename(shard), resume, dry_run=dry_run)
+    reval.writeback = Writeback(patch, fsync=fsync)
+    reval.ocrworker = Ocrworker(reval.configs, timeout, recycle)
+    skipped = 0
     # read all files
-    for filepath, filenames in tqdm(reval.files.items()):
-        reval.filecounter = 0
-        # open stream to log files
-        reval.substitutiontext.calls = defaultdict(int)
-
-        for filename in tqdm(filenames):
-            reval.current_file = filename
-            reval.update_logger()
-            try:
-                gt = unicodedata.normalize(textnormalization, filename.read_text().lstrip())
-                # Revaluate gt with ocr results
-                revaluated_gt = revaluate_ocr(gt, filename, reval)
+    with journal, reval.writeback, reval.ocrworker:
+        for filepath, filenames in tqdm(reval.files.items()):
+            reval.filecounter = 0
+            # open stream to log files
+            reval.substitutiontext.calls = defaultdict(int)
+            reval.timeouts = []
 
-                if revaluated_gt != gt and not dry_run:
-                    filename.open('w').write(revaluated_gt)
+            for filename in tqdm(filenames):
+                reval.current_file = filename
+                reval.update_logger()
+                try:
+                    text = filename.read_text()
+                    # Skip files which were completed by a previous run
+                    if resume and journal.is_completed(filename, text):
+                        for subs, count in journal.completed[str(filename.absolute())]['substitutions'].items():
+                            reval.substitutiontext.calls[subs] += count
+                        skipped += 1
+                        continue
+                    gt = unicodedata.normalize(textnormalization, text.lstrip())
+                    # Revaluate gt with ocr results
+                    revaluated_gt = revaluate_ocr(gt, filename, reval)
+                    # Files with OCR timeouts are not completed
+                    if reval.timeouts and reval.timeouts[-1] == filename:
+                        continue
 
-            except UnicodeDecodeError:
-                reval.print(f"{filename.name} (ignored)")
-                continue
+                    written = revaluated_gt != gt and not dry_run
+                    if written:
+                        reval.writeback.write(filename, revaluated_gt, text)
+                    journal.record(filename, text, revaluated_gt, written, reval.ratio, dict(reval.substitutions))
+
+                except UnicodeDecodeError:
+                    reval.print(f"{filename.name} (ignored)")
+                    continue
 
-        # Print counter
-        write_subcounter(reval)
+            # Print counter
+            write_subcounter(reval)
+    if len(reval.configs) > 1:
+        write_configsummary(reval)
+    if skipped:
+        print(f"{skipped} files were already completed in {journal.fname} and were skipped.")
+    if patch:
+        print(f"{reval.writeback.written} changed and {reval.writeback.deleted} deleted files were written to {patch}.")
 
 
 if __name__ == '__main__':
-    cli()
+    from lib.settings import ProfileError
+    try:
+        cli()
+    except ProfileError as err:
+        raise SystemExit(f"Error: {err}")
@@ -0,0 +1,69 @@
+import unicodedata
+from collections import defaultdict, OrderedDict
+from pathlib import Path
+from typing import DefaultDict
+
+from lib.counting import get_glyphcounter
+from lib.evaluation import validate_with_guidelines, categorize, missing_unicode
+from lib.functools import get_defaultdict
+from lib.linestore import Linestore
+from lib.results import Categorytree
+
+
+def analyse(results: DefaultDict, evalu, missing_unicodes=(), ucd=None) -> None:
+    """
+    Categorizes, validates and summarizes the combined glyph statistics
+    :param results: results instance with the combined glyph statistics
+    :param evalu: process handler
+    :param missing_unicodes: missing unicode profiles
+    :param ucd: unicode handler, it gets loaded if missing unicodes are requested and none is given
+    :return:
+    """
+    # Categorize the combined statistics with standard categories, the category sums are summed up along
+    categorize(results, category='combined')
+
+    # Categorize the combined statistics with customized categories
+    usr = Categorytree()
+    for category in evalu.custom_categories:
+        categorize(results, category=category, tree=usr)
+
+    # Find missing unicode glyphs
+    if missing_unicodes:
+        if ucd is None:
+            from lib.unicodetools import load_ucd
+            ucd = load_ucd(update=True)
+        for missing_unicode_profile in missing_unicodes:
+            missing_unicode(results, evalu, ucd, profile=missing_unicode_profile)
+
+    # Validate the text against the guidelines
+    if evalu.guideline:
+        validate_with_guidelines(results, evalu)
+    return
+
+
+def evaluate_lines(textlines, evalu, missing_unicodes=(), ucd=None, source='input') -> DefaultDict:
+    """
+    Evaluates textlines which are already in memory
+    :param textlines: iterable of textlines or (line id, textline) pairs
+    :param evalu: process handler
+    :param missing_unicodes: missing unicode profiles
+    :param ucd: unicode handler
+    :param source: name of the source, which is used as path index
+    :return:
+    """
+    results = defaultdict(OrderedDict)
+    results['single'] = Linestore()
+    glyphcounter = get_glyphcounter(evalu.engine)
+    get_defaultdict(results['path_indexes'], "0")
+    results['path_indexes']["0"] = Path(source)
+    lineids, lines = [], []
+    for idx, textline in enumerate(textlines):
+        lineid, textline = textline if isinstance(textline, (tuple, list)) else (f"{source}_{idx}", textline)
+        lineids.append(lineid)
+        lines.append(unicodedata.normalize(evalu.textnormalization, textline))
+    results['single'].add_file(0, Path(source), lines, lineids)
+    glyphcounter.update(lines)
+    get_defaultdict(results, 'combined')
+    glyphcounter.to_results(results['combined']['all'])
+    analyse(results, evalu, missing_unicodes, ucd)
+    return results
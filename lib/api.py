@@ -0,0 +1,105 @@
+import io
+import threading
+
+from lib.analysis import evaluate_lines
+from lib.processhandler import Evaluatehandler
+
+
+class Evaluationresult(object):
+    """
+    Structured result of an in-memory evaluation, the full results instance is kept in 'results'
+    """
+
+    def __init__(self, results, evalu):
+        self.results = results
+        self.evalu = evalu
+        lines = results['single']
+        self.lines = len(lines)
+        self.glyph = results['combined']['all']['glyph']
+        self.combined_glyph = results['combined']['all']['combined glyph']
+        self.statistics = results['combined']['cat'].get('sum', {})
+        self.categories = results['combined'].get('usr', {})
+        self.missing = results['combined'].get('missing', {})
+        self.guideline = evalu.guideline
+        self.guidelines = results['guidelines'].get(evalu.guideline, {})
+        self.violations = [{'line': lines.key(lineid).split(':', 1)[1], 'text': lines.text(lineid),
+                            'guideline_violation': dict(lines.violations[lineid])}
+                           for lineid in sorted(lines.violations)]
+
+    def to_dict(self) -> dict:
+        return {'lines': self.lines,
+                'glyph': self.glyph,
+                'combined glyph': self.combined_glyph,
+                'statistics': self.statistics,
+                'categories': self.categories,
+                'missing': self.missing,
+                'guideline': self.guideline,
+                'guidelines': self.guidelines,
+                'violations': self.violations}
+
+    def report(self) -> str:
+        """
+        Returns the statistic sections of the text report
+        :return:
+        """
+        from lib.report import report_results
+        self.evalu.fout = io.StringIO()
+        report_results(self.results, self.evalu)
+        return self.evalu.fout.getvalue()
+
+
+class Evaluator(object):
+    """
+    Evaluates textlines, which are already in memory, without the command line interface.
+    The profiles and the unicode database are loaded once and reused for every call.
+
+        evaluator = Evaluator(guideline='OCR-D-2')
+        result = evaluator.evaluate([('line_1', 'ſchoͤn'), ('line_2', 'Straße')], missing_unicodes=['GER'])
+    """
+
+    def __init__(self, guideline=None, custom_categories=('',), statistical_categories=('all',),
+                 missing_unicodes=(), textnormalization='NFC', engine='python', ucd=None, verbose=False):
+        self.guideline = guideline
+        self.custom_categories = list(custom_categories)
+        self.statistical_categories = list(statistical_categories)
+        self.missing_unicodes = list(missing_unicodes)
+        self.textnormalization = textnormalization
+        self.engine = engine
+        self.verbose = verbose
+        self.ucd = ucd
+        self._lock = threading.Lock()
+
+    def get_ucd(self):
+        """
+        Returns the unicode database, it gets loaded with the first call
+        :return:
+        """
+        with self._lock:
+            if self.ucd is None:
+                from lib.unicodetools import load_ucd
+                self.ucd = load_ucd()
+        return self.ucd
+
+    def handler(self, guideline=None, custom_categories=None, textnormalization=None) -> Evaluatehandler:
+        return Evaluatehandler((), None, True,
+                               self.custom_categories if custom_categories is None else list(custom_categories),
+                               self.statistical_categories, ['name'],
+                               self.guideline if guideline is None else guideline,
+                               textnormalization or self.textnormalization, self.engine, False, self.verbose)
+
+    def evaluate(self, textlines, source='input', guideline=None, custom_categories=None, missing_unicodes=None,
+                 textnormalization=None) -> Evaluationresult:
+        """
+        Evaluates textlines, the options override the defaults of the evaluator for this call
+        :param textlines: iterable of textlines or (line id, textline) pairs
+        :param source: name of the source, which is used as path index
+        :param guideline: guideline, e.g. 'OCR-D-2'
+        :param custom_categories: custom category profiles
+        :param missing_unicodes: missing unicode profiles
+        :param textnormalization: unicode text normalization
+        :return:
+        """
+        missing_unicodes = self.missing_unicodes if missing_unicodes is None else list(missing_unicodes)
+        ucd = self.get_ucd() if missing_unicodes else None
+        evalu = self.handler(guideline, custom_categories, textnormalization)
+        return Evaluationresult(evaluate_lines(textlines, evalu, missing_unicodes, ucd, source), evalu)
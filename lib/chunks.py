@@ -0,0 +1,140 @@
+import mmap
+from pathlib import Path
+
+from lib.counting import get_glyphcounter
+from lib.evaluation import count_regex_violations, merge_regex_violations
+from lib.io import normalize_textlines
+
+# Size of the chunks of large files in bytes
+CHUNKSIZE = 64 * 2 ** 20
+
+
+def line_chunks(fname: Path, chunksize=CHUNKSIZE) -> list:
+    """
+    Splits a file into byte ranges of about the chunk size, which end at a line boundary.
+    A linebreak byte never occurs inside of an utf-8 sequence, so every chunk can be decoded on its own.
+    :param fname: filename
+    :param chunksize: size of the chunks in bytes
+    :return: list of tuples of start and end offset
+    """
+    chunks = []
+    with open(fname, 'rb') as fin:
+        size = fin.seek(0, 2)
+        if not size:
+            return chunks
+        with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = mm.find(b'\n', min(start + chunksize, size) - 1)
+                end = size if end == -1 else end + 1
+                chunks.append((start, end))
+                start = end
+    return chunks
+
+
+def count_chunk(fname: Path, start: int, end: int, size: int, textnormalizations, engine, guidelines,
+                ngramoptions=None) -> dict:
+    """
+    Decodes, normalizes and counts one chunk of a memory-mapped file
+    :param fname: filename
+    :param start: start offset
+    :param end: end offset
+    :param size: size of the file, the whitespaces at the start and the end of the file are stripped
+    :param textnormalizations: unicode text normalizations
+    :param engine: counting engine
+    :param guidelines: guidelines, whose regex violations are counted
+    :param ngramoptions: arguments of the n-gram counter (sizes, mode, topk) or None
+    :return: dict with the text normalization as key and the glyphcounter, the n-gram counter,
+    the regex violations and the number of lines as value
+    """
+    with open(fname, 'rb') as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8')
+    # Universal newlines like the text mode of read_textlines, a chunk ends after a '\n' so no '\r\n' is split
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if start == 0:
+        text = text.lstrip()
+    text = text.rstrip() if end == size else text[:-1] if text.endswith('\n') else text
+    textlines = text.split('\n') if text else []
+    del text
+    counts = {}
+    for textnormalization in textnormalizations:
+        normalized = normalize_textlines(textlines, textnormalization)
+        glyphcounter = get_glyphcounter(engine)
+        glyphcounter.update(normalized)
+        glyphcounter.flush()
+        ngramcounter = None
+        if ngramoptions:
+            from lib.ngrams import Ngramcounter
+            ngramcounter = Ngramcounter(*ngramoptions)
+            ngramcounter.update(normalized)
+            ngramcounter.flush()
+        counts[textnormalization] = (glyphcounter, ngramcounter, count_regex_violations(normalized, guidelines),
+                                     len(normalized))
+    return counts
+
+
+def _count_chunk(args):
+    return count_chunk(*args)
+
+
+class Chunkreader(object):
+    """
+    Reads files, which are larger than the chunk size, memory-mapped in chunks, which end at line boundaries.
+    The chunks are decoded, normalized and counted independently, so only one chunk per process is in memory
+    and the chunks of a file can be processed in parallel.
+    """
+
+    def __init__(self, textnormalizations, engine='python', guidelines=None, ngramoptions=None,
+                 chunksize=CHUNKSIZE, jobs=1):
+        self.textnormalizations = list(textnormalizations)
+        self.engine = engine
+        self.guidelines = guidelines or {}
+        self.ngramoptions = ngramoptions
+        self.chunksize = chunksize
+        self.jobs = jobs
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_large(self, fname: Path) -> bool:
+        return fname.stat().st_size > self.chunksize
+
+    def read(self, fname: Path) -> dict:
+        """
+        Counts all chunks of a file, a decoding error in any chunk raises an UnicodeDecodeError
+        :param fname: filename
+        :return: dict with the text normalization as key and the merged glyphcounter, n-gram counter,
+        regex violations and number of lines as value
+        """
+        size = fname.stat().st_size
+        tasks = [(fname, start, end, size, self.textnormalizations, self.engine, self.guidelines,
+                  self.ngramoptions) for start, end in line_chunks(fname, self.chunksize)]
+        if self.jobs > 1 and len(tasks) > 1:
+            if self._pool is None:
+                import multiprocessing
+                self._pool = multiprocessing.Pool(self.jobs)
+            chunkcounts = self._pool.imap_unordered(_count_chunk, tasks)
+        else:
+            chunkcounts = map(_count_chunk, tasks)
+        merged = {}
+        for counts in chunkcounts:
+            for textnormalization, (glyphcounter, ngramcounter, violations, lines) in counts.items():
+                if textnormalization not in merged:
+                    merged[textnormalization] = [glyphcounter, ngramcounter, violations, lines]
+                    continue
+                merged[textnormalization][0].merge(glyphcounter)
+                if ngramcounter is not None:
+                    merged[textnormalization][1].merge(ngramcounter)
+                merged[textnormalization][2] = merge_regex_violations(merged[textnormalization][2], violations)
+                merged[textnormalization][3] += lines
+        return {textnormalization: tuple(counts) for textnormalization, counts in merged.items()}
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,149 @@
+import json
+import sys
+from pathlib import Path
+
+from lib.report import addinfo
+from lib.evaluation import controlcharacter_check
+from lib.snapshot import SNAPSHOT_FORMAT, _open_snapshot, merge_snapshots, load_snapshot
+
+COMPARE_SECTIONS = ['glyph', 'combined glyph', 'categories', 'guidelines', 'missing']
+
+
+def load_results(fname, evalu, missing_unicodes=()) -> dict:
+    """
+    Loads stored results, which are either the json results of an evaluation or a statistics snapshot.
+    Snapshots are analysed with the guideline and the missing unicode profiles of the process handler.
+    :param fname: filename of the results
+    :param evalu: process handler
+    :param missing_unicodes: missing unicode profiles
+    :return:
+    """
+    fname = Path(fname)
+    try:
+        with _open_snapshot(fname, 'r') as fin:
+            results = json.load(fin)
+    except (UnicodeDecodeError, OSError, json.JSONDecodeError):
+        results = None
+    if isinstance(results, dict) and results.get('format') == SNAPSHOT_FORMAT:
+        from lib.analysis import analyse
+        results = merge_snapshots([load_snapshot(fname)], evalu)
+        analyse(results, evalu, missing_unicodes)
+        return results
+    if not isinstance(results, dict) or 'combined' not in results:
+        if isinstance(results, dict) and results and all('combined' in result for result in results.values()):
+            raise ValueError(f"{fname} contains the results of the text normalizations {', '.join(results)}, "
+                             f"please store one text normalization per result")
+        raise ValueError(f"{fname} is not a stored evaluation result")
+    return results
+
+
+def _category_sums(sums: dict, prefix=()) -> dict:
+    flat = {}
+    for key, val in sums.items():
+        if key == 'sum':
+            flat[' / '.join(prefix) or 'Total'] = val
+        elif isinstance(val, dict):
+            flat.update(_category_sums(val, prefix + (key,)))
+    return flat
+
+
+def _glyph(codepoint) -> str:
+    # Json results store the codepoints of the guideline violations as strings
+    return chr(int(codepoint)) if isinstance(codepoint, int) or codepoint.isdigit() else codepoint
+
+
+def flatten_results(results: dict) -> dict:
+    """
+    Flattens the comparable statistics of a results instance
+    :param results: results instance
+    :return: dict with the compare sections as key and dicts of counts (missing: sets of glyphs) as value
+    """
+    combined = results.get('combined', {})
+    flat = {'glyph': dict(combined.get('all', {}).get('glyph', {})),
+            'combined glyph': dict(combined.get('all', {}).get('combined glyph', {})),
+            'categories': {}, 'guidelines': {}, 'missing': {}}
+    flat['categories'].update(_category_sums(combined.get('cat', {}).get('sum', {})))
+    # The sums of the custom categories are keyed by their category names, e.g. 'Fraktur / Long s'
+    for category, sums in combined.get('usr', {}).get('sum', {}).items():
+        if category != 'sum':
+            flat['categories'].update(_category_sums(sums, (category,)))
+    for guideline, conditions in results.get('guidelines', {}).items():
+        for conditionkey, counts in conditions.items():
+            for condition, count in counts.items():
+                if 'regex' not in conditionkey.lower():
+                    condition = _glyph(condition)
+                flat['guidelines'][f"{guideline} / {conditionkey} / {condition}"] = count
+    for profile, subsettings in combined.get('missing', {}).items():
+        for subsetting, glyphs in subsettings.items():
+            flat['missing'][f"{profile} / {subsetting}"] = {chr(glyph) if isinstance(glyph, int) else glyph
+                                                            for glyph in glyphs}
+    return flat
+
+
+def compare_results(old: dict, new: dict) -> dict:
+    """
+    Compares two results instances and keeps only the deltas
+    :param old: results instance of the old dataset or run
+    :param new: results instance of the new dataset or run
+    :return: dict with the compare sections as key, counts as {key: {'old', 'new', 'delta'}} and
+    missing glyphs as {key: {'added', 'removed'}}
+    """
+    old, new = flatten_results(old), flatten_results(new)
+    deltas = {}
+    for section in COMPARE_SECTIONS:
+        deltas[section] = {}
+        for key in sorted(set(old[section]).union(new[section]), key=str):
+            if section == 'missing':
+                added = sorted(new[section].get(key, set()) - old[section].get(key, set()))
+                removed = sorted(old[section].get(key, set()) - new[section].get(key, set()))
+                if added or removed:
+                    deltas[section][key] = {'added': added, 'removed': removed}
+                continue
+            oldcount, newcount = old[section].get(key, 0), new[section].get(key, 0)
+            if oldcount != newcount:
+                deltas[section][key] = {'old': oldcount, 'new': newcount, 'delta': newcount - oldcount}
+    return deltas
+
+
+def _glyphinfo(evalu, glyph) -> str:
+    return f"{'{'}{repr(glyph) if controlcharacter_check(glyph) else glyph}{'}'}{addinfo(evalu, glyph)}"
+
+
+def create_compare_report(deltas: dict, evalu, old, new) -> None:
+    """
+    Creates the report of the deltas between two results
+    :param deltas: deltas instance
+    :param evalu: process handler
+    :param old: name of the old results
+    :param new: name of the new results
+    :return:
+    """
+    fout = open(evalu.output, 'w') if evalu.output else sys.stdout
+    fout.write(f"""
+    Compare-Report Version 0.1
+    Old: {Path(old).resolve()}
+    New: {Path(new).resolve()}
+    \n{"-" * 60}\n""")
+    for section in COMPARE_SECTIONS:
+        fout.write(f"""
+        {section.capitalize()}
+        {"-" * len(section)}""")
+        if not deltas[section]:
+            fout.write("""
+                            No differences""")
+        for key, delta in sorted(deltas[section].items(), key=lambda item: -abs(item[1].get('delta', 0))):
+            if section == 'missing':
+                for change in ['added', 'removed']:
+                    if delta[change]:
+                        fout.write(f"""
+                            ‎{key} {change}: {' '.join(delta[change])}""")
+                continue
+            info = _glyphinfo(evalu, key) if section in ['glyph', 'combined glyph'] else key
+            fout.write(f"""
+                            ‎{delta['delta']:+{7}}  ({delta['old']} → {delta['new']})  {info}""")
+        fout.write(f"""
+    \n{"-" * 60}\n""")
+    fout.flush()
+    if fout != sys.stdout:
+        fout.close()
+    return
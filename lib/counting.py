@@ -0,0 +1,136 @@
+from collections import Counter
+
+from lib.graphemes import grapheme_clusters
+
+# Number of characters which are collected before a batch gets counted
+BATCHSIZE = 2 ** 22
+
+
+class Glyphcounter(object):
+    """
+    Counts the glyphs and combined glyphs (extended grapheme clusters) of textlines batchwise
+    """
+
+    def __init__(self, batchsize=BATCHSIZE):
+        self.batchsize = batchsize
+        self.glyph = Counter()
+        self.combined_glyph = Counter()
+        self._batch = []
+        self._batchlen = 0
+
+    def add(self, textline: str) -> None:
+        """
+        Adds a single textline to the current batch
+        :param textline: textline without linebreaks
+        :return:
+        """
+        self._batch.append(textline)
+        self._batchlen += len(textline) + 1
+        if self._batchlen >= self.batchsize:
+            self.flush()
+
+    def update(self, textlines) -> None:
+        """
+        Adds multiple textlines to the current batch
+        :param textlines: iterable of textlines
+        :return:
+        """
+        for textline in textlines:
+            self.add(textline)
+
+    def flush(self) -> None:
+        """
+        Counts the current batch, the textlines are separated by linebreaks
+        :return:
+        """
+        if self._batch:
+            self._count_batch('\n'.join(self._batch), len(self._batch) - 1)
+        self._batch = []
+        self._batchlen = 0
+
+    def _count_batch(self, text: str, separators: int) -> None:
+        self.glyph.update(text)
+        if separators:
+            self.glyph['\n'] -= separators
+            if self.glyph['\n'] <= 0:
+                del self.glyph['\n']
+        self.combined_glyph.update(grapheme_clusters(text))
+
+    def merge(self, other) -> None:
+        """
+        Adds the statistics of another glyphcounter of the same engine
+        :param other: glyphcounter
+        :return:
+        """
+        self.flush()
+        other.flush()
+        self.glyph.update(other.glyph)
+        self.combined_glyph.update(other.combined_glyph)
+
+    def to_results(self, res_all) -> None:
+        """
+        Stores the counted statistics in the results instance
+        :param res_all: results['combined']['all'] instance
+        :return:
+        """
+        self.flush()
+        res_all['glyph'] = self.glyph
+        res_all['combined glyph'] = self.combined_glyph
+
+
+class NumpyGlyphcounter(Glyphcounter):
+    """
+    Counts the glyphs of textlines batchwise as UTF-32 codepoint arrays
+    """
+
+    def __init__(self, batchsize=BATCHSIZE):
+        import numpy as np
+        super().__init__(batchsize)
+        self._np = np
+        self._codepoints = np.zeros(0x110000, dtype=np.int64)
+
+    def __getstate__(self):
+        # The numpy module can't be pickled, e.g. when the counter of a chunk is returned from a worker process
+        state = self.__dict__.copy()
+        del state['_np']
+        return state
+
+    def __setstate__(self, state):
+        import numpy as np
+        self.__dict__.update(state)
+        self._np = np
+
+    def _count_batch(self, text: str, separators: int) -> None:
+        np = self._np
+        codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        self._codepoints += np.bincount(codepoints, minlength=0x110000)
+        self._codepoints[10] -= separators
+        self.combined_glyph.update(grapheme_clusters(text))
+
+    def merge(self, other) -> None:
+        self.flush()
+        other.flush()
+        self._codepoints += other._codepoints
+        self.combined_glyph.update(other.combined_glyph)
+
+    def to_results(self, res_all) -> None:
+        self.flush()
+        codepoints = self._np.flatnonzero(self._codepoints > 0)
+        self.glyph = Counter({chr(codepoint): int(self._codepoints[codepoint]) for codepoint in codepoints})
+        res_all['glyph'] = self.glyph
+        res_all['combined glyph'] = self.combined_glyph
+
+
+def get_glyphcounter(engine='python', batchsize=BATCHSIZE) -> Glyphcounter:
+    """
+    Returns the glyphcounter for the requested counting engine
+    :param engine: 'python' or 'numpy'
+    :param batchsize: number of characters per batch
+    :return:
+    """
+    if engine == 'numpy':
+        try:
+            return NumpyGlyphcounter(batchsize)
+        except ImportError:
+            print("The numpy engine is not available. Please install numpy.")
+    return Glyphcounter(batchsize)
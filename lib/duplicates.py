@@ -0,0 +1,237 @@
+import hashlib
+import random
+import zlib
+from array import array
+from collections import defaultdict, OrderedDict
+
+# Minimum estimated Jaccard similarity of the character shingles of near duplicates
+DUPLICATE_SIMILARITY = 0.8
+SHINGLE_SIZE = 3
+# The LSH bands of rows r catch pairs above a similarity of about (1 / bands) ** (1 / r)
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+# Buckets with more members are only compared to their first member
+MAX_BUCKET_PAIRS = 100
+MERSENNE_PRIME = (1 << 61) - 1
+UINT64_MASK = (1 << 64) - 1
+UINT32_MASK = (1 << 32) - 1
+# Odd multiplier of the band hashes
+BAND_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def duplicate_key(text: str) -> str:
+    """
+    Normalizes the whitespaces of a textline for the duplicate detection
+    :param text: textline
+    :return:
+    """
+    return ' '.join(text.split())
+
+
+def shingle_hashes(text: str, size=SHINGLE_SIZE) -> set:
+    """
+    Returns the hashes of the character shingles of a text
+    :param text: text
+    :param size: shingle size
+    :return:
+    """
+    return {zlib.crc32(text[idx:idx + size].encode('utf-8')) for idx in range(max(len(text) - size + 1, 1))}
+
+
+class Minhasher(object):
+    """
+    Computes MinHash signatures with random linear permutations of the shingle hashes, with numpy if it is available
+    """
+
+    def __init__(self, permutations=MINHASH_PERMUTATIONS, seed=1):
+        rng = random.Random(seed)
+        self.permutations = permutations
+        # a * hash + b wraps around at 2**64 like the uint64 arithmetic of numpy, so both give the same signatures
+        self.a = [rng.randrange(1, MERSENNE_PRIME) for _ in range(permutations)]
+        self.b = [rng.randrange(0, MERSENNE_PRIME) for _ in range(permutations)]
+        try:
+            import numpy as np
+            self._np = np
+            self._a = np.array(self.a, dtype=np.uint64)[:, None]
+            self._b = np.array(self.b, dtype=np.uint64)[:, None]
+        except ImportError:
+            self._np = None
+
+    def signature(self, hashes: set) -> array:
+        """
+        Returns the MinHash signature of a set of shingle hashes
+        :param hashes: shingle hashes
+        :return: array of 32 bit values
+        """
+        if self._np is not None:
+            np = self._np
+            values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+            permuted = (self._a * values + self._b) % np.uint64(MERSENNE_PRIME) & np.uint64(UINT32_MASK)
+            return array('I', permuted.min(axis=1).astype(np.uint32).tobytes())
+        return array('I', (min(((a * value + b) & UINT64_MASK) % MERSENNE_PRIME & UINT32_MASK for value in hashes)
+                           for a, b in zip(self.a, self.b)))
+
+
+class Signatures(object):
+    """
+    Stores the MinHash signatures of all distinct lines in one flat array of 32 bit values,
+    numpy views it as N x permutations matrix
+    """
+
+    def __init__(self, permutations=MINHASH_PERMUTATIONS):
+        self.permutations = permutations
+        self.values = array('I')
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.values) // self.permutations
+
+    def append(self, signature: array) -> None:
+        self.values.extend(signature)
+        self._matrix = None
+
+    def matrix(self, np):
+        if self._matrix is None:
+            self._matrix = np.frombuffer(self.values, dtype=np.uint32).reshape(-1, self.permutations)
+        return self._matrix
+
+    def similarity(self, idx: int, other: int, np=None) -> float:
+        """
+        Estimates the Jaccard similarity of two lines by the share of equal signature values
+        :param idx: index of the line
+        :param other: index of the other line
+        :param np: numpy module or None
+        :return:
+        """
+        if np is not None:
+            matrix = self.matrix(np)
+            return np.count_nonzero(matrix[idx] == matrix[other]) / self.permutations
+        start, otherstart = idx * self.permutations, other * self.permutations
+        return sum(val == otherval for val, otherval in zip(self.values[start:start + self.permutations],
+                                                            self.values[otherstart:otherstart + self.permutations])
+                   ) / self.permutations
+
+    def band_buckets(self, band: int, rows: int, np=None):
+        """
+        Yields the buckets with more than one line, whose band slices have the same hash
+        :param band: band number
+        :param rows: rows per band
+        :param np: numpy module or None
+        :return: lists of line indexes
+        """
+        if np is not None:
+            # Hash of the band slice by a multiply-add over its values (wrapping at 2**64)
+            keys = np.zeros(len(self), dtype=np.uint64)
+            for row, value in enumerate(self.matrix(np)[:, band * rows:(band + 1) * rows].T):
+                keys = keys * np.uint64(BAND_MULTIPLIER) + value.astype(np.uint64) + np.uint64(row)
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            bounds = np.flatnonzero(np.diff(keys)) + 1
+            for start, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(keys)]))):
+                if end - start > 1:
+                    yield order[start:end].tolist()
+            return
+        buckets = defaultdict(list)
+        for idx in range(len(self)):
+            start = idx * self.permutations + band * rows
+            buckets[hash(tuple(self.values[start:start + rows]))].append(idx)
+        for members in buckets.values():
+            if len(members) > 1:
+                yield members
+
+
+class Unionfind(object):
+
+    def __init__(self, size: int):
+        self.parents = array('Q', range(size))
+
+    def find(self, idx: int) -> int:
+        while self.parents[idx] != idx:
+            self.parents[idx] = self.parents[self.parents[idx]]
+            idx = self.parents[idx]
+        return idx
+
+    def union(self, idx: int, other: int) -> None:
+        self.parents[self.find(idx)] = self.find(other)
+
+
+def _cluster(lines, lineids: list, path_indexes: dict) -> dict:
+    locations = []
+    for lineid in lineids:
+        fname, linenumber = lines.location(lineid)
+        locations.append({'path': str(path_indexes.get(f"{lines.pid(lineid)}", '')), 'file': str(fname),
+                          'line': linenumber + 1, 'key': lines.key(lineid), 'text': lines.text(lineid)})
+    return {'count': len(locations),
+            'datasets': sorted(set(location['path'] for location in locations)),
+            'texts': list(OrderedDict.fromkeys(location['text'] for location in locations)),
+            'locations': locations}
+
+
+def find_duplicates(lines, path_indexes: dict, similarity=DUPLICATE_SIMILARITY,
+                    permutations=MINHASH_PERMUTATIONS, bands=LSH_BANDS) -> dict:
+    """
+    Finds exact duplicates by the hash of the whitespace normalized textlines and near duplicates by
+    MinHash/LSH over the character shingles of the distinct textlines. Only the hashes, the first line id and
+    the signature of every distinct line are kept, the texts of the clusters are read back from the linestore.
+    :param lines: linestore
+    :param path_indexes: path indexes of the results instance
+    :param similarity: minimum estimated Jaccard similarity of near duplicates (1 finds only exact duplicates)
+    :param permutations: number of MinHash permutations
+    :param bands: number of LSH bands
+    :return: dict with the summary and the exact and near duplicate clusters
+    """
+    near_duplicates = similarity < 1
+    minhasher = Minhasher(permutations) if near_duplicates else None
+    signatures = Signatures(permutations)
+    distinct = {}
+    firstlines = array('Q')
+    duplicates = defaultdict(list)
+    for lineid, text in lines.items():
+        key = duplicate_key(text)
+        if not key:
+            continue
+        digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+        idx = distinct.get(digest)
+        if idx is not None:
+            duplicates[idx].append(lineid)
+            continue
+        distinct[digest] = len(firstlines)
+        firstlines.append(lineid)
+        if near_duplicates:
+            signatures.append(minhasher.signature(shingle_hashes(key)))
+    del distinct
+
+    def group_lineids(idx):
+        return [firstlines[idx]] + duplicates.get(idx, [])
+
+    components = []
+    if near_duplicates and len(firstlines) > 1:
+        np = minhasher._np
+        rows = permutations // bands
+        unionfind = Unionfind(len(firstlines))
+        for band in range(bands):
+            for members in signatures.band_buckets(band, rows, np):
+                for pos, idx in enumerate(members[1:], start=1):
+                    others = members[:pos] if len(members) <= MAX_BUCKET_PAIRS else members[:1]
+                    for other in others:
+                        if unionfind.find(idx) != unionfind.find(other) and \
+                                signatures.similarity(idx, other, np) >= similarity:
+                            unionfind.union(idx, other)
+        members = defaultdict(list)
+        for idx in range(len(firstlines)):
+            members[unionfind.find(idx)].append(idx)
+        components = [component for component in members.values() if len(component) > 1]
+
+    exact = [_cluster(lines, group_lineids(idx), path_indexes) for idx in duplicates]
+    near = [_cluster(lines, [lineid for idx in component for lineid in group_lineids(idx)], path_indexes)
+            for component in components]
+    exact.sort(key=lambda cluster: -cluster['count'])
+    near.sort(key=lambda cluster: -cluster['count'])
+    return {'summary': {'lines': len(firstlines) + sum(len(lineids) for lineids in duplicates.values()),
+                        'distinct lines': len(firstlines),
+                        'exact clusters': len(exact),
+                        'exact duplicate lines': sum(cluster['count'] - 1 for cluster in exact),
+                        'near clusters': len(near),
+                        'cross-dataset clusters': sum(len(cluster['datasets']) > 1 for cluster in exact + near)},
+            'exact': exact,
+            'near': near}
@@ -1,11 +1,12 @@
-import re
 import unicodedata
 from collections import defaultdict
 import itertools
+from functools import lru_cache
 from typing import DefaultDict
 
 from lib.functools import get_defaultdict
-from lib.settings import load_profiles
+from lib.results import Categorytree, codepoint_counts
+from lib.settings import load_profiles, compiled_regex
 
 
 def controlcharacter_check(glyph: str):
@@ -20,45 +21,55 @@ def controlcharacter_check(glyph: str):
         return False
 
 
-def categorize(results: DefaultDict, category='combined') -> None:
+@lru_cache(maxsize=None)
+def glyphinfo(glyph: str):
     """
-    Puts the unicode character in user-definied categories
+    Returns the unicode name, category and subcategory of a glyph
+    :param glyph: unicode glyph
+    :return:
+    """
+    if controlcharacter_check(glyph):
+        return "L", "S", "CC"
+    try:
+        uname = unicodedata.name(glyph)
+        return uname, unicodedata.category(glyph), uname.split(' ')[0]
+    except ValueError:
+        return "Unknow", "Unknow", "Unknow"
+
+
+def categorize(results: DefaultDict, category='combined', tree=None) -> Categorytree:
+    """
+    Puts the unicode character in user-definied categories, the category sums are summed up along
     :param results: results instance
     :param category: category
-    :return:
+    :param tree: category tree of the custom categories, which collects multiple categories into 'usr'
+    :return: category tree
     """
+    tree = Categorytree() if tree is None else tree
     get_defaultdict(results["combined"], "cat")
     if category == 'combined':
         for glyph, count in results[category]['all']['glyph'].items():
-            if controlcharacter_check(glyph):
-                uname, ucat, usubcat = "L", "S", "CC"
-            else:
-                try:
-                    uname = unicodedata.name(glyph)
-                    ucat = unicodedata.category(glyph)
-                    usubcat = uname.split(' ')[0]
-                except ValueError:
-                    uname, ucat, usubcat = "Unknow", "Unknow", "Unknow"
-            get_defaultdict(results[category]["cat"], ucat[0])
-            get_defaultdict(results[category]["cat"][ucat[0]], usubcat)
-            get_defaultdict(results[category]["cat"][ucat[0]][usubcat], ucat)
-            results[category]["cat"][ucat[0]][usubcat][ucat].update({glyph: count})
+            uname, ucat, usubcat = glyphinfo(glyph)
+            tree.add((ucat[0], usubcat, ucat), glyph, count)
+        tree.to_results(results[category]["cat"])
     else:
         get_defaultdict(results["combined"], "usr")
         categories = load_profiles("profiles/evaluate/categories")
         if categories and category in categories.keys():
-            get_defaultdict(results["combined"]["usr"], category)
+            tree.add_path((category,))
             for glyph, count in results['combined']['all']['glyph'].items():
+                uname = "ControlCharacter" if controlcharacter_check(glyph) else glyphinfo(glyph)[0]
                 for subcat, subkeys in categories[category].items():
-                    for subkey in subkeys:
-                        if controlcharacter_check(glyph):
-                            uname = "ControlCharacter"
-                        else:
-                            uname = unicodedata.name(glyph)
-                        if ord(glyph) == subkey or subkey in uname:
-                            get_defaultdict(results["combined"]["usr"][category], subcat)
-                            results["combined"]["usr"][category][subcat][glyph] = count
-    return
+                    if isinstance(subkeys, frozenset):
+                        # Resolved codepoint rules
+                        found = ord(glyph) in subkeys
+                    else:
+                        found = any([ord(glyph) == subkey if isinstance(subkey, int) else subkey in uname
+                                     for subkey in subkeys])
+                    if found:
+                        tree.add((category, subcat), glyph, count)
+            tree.to_results(results["combined"]["usr"])
+    return tree
 
 
 def missing_unicode(results: DefaultDict, evalu, ucd, profile) -> None:
@@ -72,7 +83,8 @@ def missing_unicode(results: DefaultDict, evalu, ucd, profile) -> None:
     """
     get_defaultdict(results["combined"], "missing", list)
     missing_unicodes = load_profiles("profiles/evaluate/missing_unicode")
-    uc_codepoints = set(results['combined']['all']['codepoints'].keys())
+    codepoints = codepoint_counts(results['combined']['all'])
+    uc_codepoints = set(codepoints.keys())
     uc_combinded_glyphs = set(results['combined']['all']['combined glyph'].keys())
     if missing_unicodes and profile in missing_unicodes.keys():
         get_defaultdict(results["combined"]["missing"], profile, list)
@@ -114,6 +126,43 @@ def check_unicode(resdict, profiles, uc_codepoints, uc_combinded_glyphs, func='d
     return
 
 
+def count_regex_violations(textlines, guidelines) -> dict:
+    """
+    Counts the regex violations of all guidelines
+    :param textlines: iterable of textlines
+    :param guidelines: guidelines instance
+    :return:
+    """
+    patterns = [(guideline, conditionkey, condition, compiled_regex(condition))
+                  for guideline, guidelineconditions in (guidelines or {}).items()
+                  for conditionkey, conditionvals in guidelineconditions.items() if "regex" in conditionkey.lower()
+                  for condition in conditionvals]
+    regex_violations = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    for text in textlines:
+        for guideline, conditionkey, condition, pattern in patterns:
+            count = len(pattern.findall(text))
+            if count:
+                regex_violations[guideline][conditionkey][condition] += count
+    return {guideline: {conditionkey: dict(counts) for conditionkey, counts in conditions.items()}
+            for guideline, conditions in regex_violations.items()}
+
+
+def merge_regex_violations(*violations) -> dict:
+    """
+    Sums up regex violation counts
+    :param violations: regex violation counts per guideline, see count_regex_violations
+    :return:
+    """
+    merged = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    for regex_violations in violations:
+        for guideline, conditions in regex_violations.items():
+            for conditionkey, counts in conditions.items():
+                for condition, count in counts.items():
+                    merged[guideline][conditionkey][condition] += count
+    return {guideline: {conditionkey: dict(counts) for conditionkey, counts in conditions.items()}
+            for guideline, conditions in merged.items()}
+
+
 def validate_with_guidelines(results: DefaultDict, evalu) -> None:
     """
     Validates each unicode character against the OCR-D or user-definded guidelines
@@ -124,42 +173,51 @@ def validate_with_guidelines(results: DefaultDict, evalu) -> None:
     guideline = evalu.guideline
     guidelines = evalu.guidelines
     get_defaultdict(results, "guidelines")
-    uc_codepoints = set(results['combined']['all']['codepoints'].keys())
+    codepoints = codepoint_counts(results['combined']['all'])
+    uc_codepoints = set(codepoints.keys())
     uc_combinded_glyphs = set(results['combined']['all']['combined glyph'].keys())
     if guidelines and guideline in guidelines.keys():
         get_defaultdict(results["guidelines"], guideline)
         for conditionkey, conditions in guidelines[guideline].items():
-            for condition in conditions:
-                if "regex" in conditionkey.lower():
-                    for file, fileinfo in results['single'].items():
-                        text = fileinfo['text']
-                        count = re.findall(rf"{condition}", text)
+            if "regex" in conditionkey.lower():
+                for condition in conditions:
+                    # Merged results and chunked files only provide the regex violation counts
+                    count = results.get('regex violations', {}).get(guideline, {}).get(conditionkey, {}).get(
+                        condition, 0)
+                    if count:
+                        get_defaultdict(results["guidelines"][guideline], conditionkey, instance=int)
+                        results["guidelines"][guideline][conditionkey][condition] += count
+                    if not results.get('single'):
+                        continue
+                    for lineid, text in results['single'].items():
+                        count = compiled_regex(condition).findall(text)
                         if count:
                             get_defaultdict(results["guidelines"][guideline], conditionkey, instance=int)
                             results["guidelines"][guideline][conditionkey][condition] += len(count)
-                            pid, file = file.split(':', 1)
-                            file = str(results['path_indexes'][f"{pid}"].joinpath(file.rsplit('_', 1)[0]))
-                            evalu.print(str(file))
+                            fname, _ = results['single'].location(lineid)
+                            evalu.print(str(fname))
                             evalu.print(condition)
                             evalu.print(text + '\n')
                             if evalu.json:
-                                get_defaultdict(results['single'][file], 'guideline_violation', instance=int)
-                                results['single'][file]['guideline_violation'][condition] += len(count)
-                else:
-                    violation_codepoints = defaultdict(list)
-                    check_unicode(violation_codepoints, guidelines[guideline], uc_codepoints, uc_combinded_glyphs,
-                                  func='intersection')
-                    violation_codepoint_dict = {
-                        violation_codepoint: results['combined']['all']['codepoints'][violation_codepoint] for
-                        violation_codepoint in set(itertools.chain.from_iterable(violation_codepoints.values()))}
-                    if violation_codepoint_dict:
-                        results["guidelines"][guideline][conditionkey].update(violation_codepoint_dict)
-                    if evalu.json:
-                        for violation_codepoint in results["guidelines"][guideline][conditionkey]:
-                            for file, fileinfo in results['single'].items():
-                                text = fileinfo['text']
-                                if chr(violation_codepoint) in text:
-                                    get_defaultdict(results['single'][file], 'guideline_violation', instance=int)
-                                    results['single'][file]['guideline_violation'][condition] += text.count(
-                                        chr(violation_codepoint))
+                                results['single'].add_violation(lineid, condition, len(count))
+            else:
+                violation_codepoints = defaultdict(list)
+                check_unicode(violation_codepoints, {conditionkey: conditions}, uc_codepoints, uc_combinded_glyphs,
+                              func='intersection')
+                # Combined rules match the combined glyphs (grapheme clusters), all other rules single codepoints
+                counts = results['combined']['all']['combined glyph'] \
+                    if conditionkey.lower().startswith('combined') else codepoints
+                violation_codepoint_dict = {
+                    violation_codepoint: counts[violation_codepoint] for
+                    violation_codepoint in set(itertools.chain.from_iterable(violation_codepoints.values()))
+                    if violation_codepoint in counts}
+                if violation_codepoint_dict:
+                    results["guidelines"][guideline][conditionkey].update(violation_codepoint_dict)
+                if evalu.json and results.get('single'):
+                    for violation_codepoint in violation_codepoint_dict:
+                        glyph = chr(violation_codepoint) if isinstance(violation_codepoint, int) \
+                            else violation_codepoint
+                        for lineid, text in results['single'].items():
+                            if glyph in text:
+                                results['single'].add_violation(lineid, glyph, text.count(glyph))
     return
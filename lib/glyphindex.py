@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import unicodedata
+from array import array
+from collections import defaultdict
+from pathlib import Path
+
+from lib.graphemes import grapheme_cluster_spans
+from lib.settings import compiled_regex
+
+# Increase if the schema of the index changes
+GLYPHINDEX_VERSION = 1
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE files (fileid INTEGER PRIMARY KEY, path TEXT);
+CREATE TABLE lines (fileid INTEGER, line INTEGER, text TEXT, PRIMARY KEY (fileid, line)) WITHOUT ROWID;
+CREATE TABLE glyphs (codepoint INTEGER, fileid INTEGER, positions BLOB);
+CREATE TABLE combined (glyph TEXT, fileid INTEGER, positions BLOB);
+"""
+INDEXES = """
+CREATE INDEX glyphs_codepoint ON glyphs (codepoint);
+CREATE INDEX combined_glyph ON combined (glyph);
+"""
+
+
+def create_glyphindex(fname, lines, textnormalization) -> None:
+    """
+    Creates the inverted index from the glyphs and combined glyphs to their locations (file, line, offset).
+    The locations of a glyph are stored per file as array of line and offset pairs.
+    :param fname: filename of the index
+    :param lines: linestore with the textlines of all files
+    :param textnormalization: text normalization of the textlines
+    :return:
+    """
+    fname = Path(fname)
+    tmpname = fname.with_name(f".{fname.name}.tmp")
+    if tmpname.exists():
+        tmpname.unlink()
+    con = sqlite3.connect(tmpname)
+    try:
+        con.execute("PRAGMA journal_mode = OFF")
+        con.execute("PRAGMA synchronous = OFF")
+        con.executescript(SCHEMA)
+        con.executemany("INSERT INTO meta VALUES (?, ?)", [('version', str(GLYPHINDEX_VERSION)),
+                                                            ('textnormalization', textnormalization)])
+        for fileid, (path, buffer) in enumerate(zip(lines.paths, lines.file_texts())):
+            glyphs = defaultdict(lambda: array('I'))
+            combined = defaultdict(lambda: array('I'))
+            textlines = buffer.split('\n')
+            for lineno, text in enumerate(textlines):
+                for offset, glyph in enumerate(text):
+                    glyphs[glyph].extend((lineno, offset))
+                for offset, cluster in grapheme_cluster_spans(text):
+                    combined[cluster].extend((lineno, offset))
+            con.execute("INSERT INTO files VALUES (?, ?)", (fileid, str(path)))
+            con.executemany("INSERT INTO lines VALUES (?, ?, ?)",
+                            [(fileid, lineno, text) for lineno, text in enumerate(textlines)])
+            con.executemany("INSERT INTO glyphs VALUES (?, ?, ?)",
+                            [(ord(glyph), fileid, positions.tobytes()) for glyph, positions in glyphs.items()])
+            con.executemany("INSERT INTO combined VALUES (?, ?, ?)",
+                            [(cluster, fileid, positions.tobytes()) for cluster, positions in combined.items()])
+        con.executescript(INDEXES)
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmpname, fname)
+
+
+def codepoint_ranges(codepoints) -> list:
+    """
+    Merges codepoints into ranges of consecutive codepoints
+    :param codepoints: iterable of codepoints
+    :return: list of tuples of first and last codepoint
+    """
+    ranges = []
+    for codepoint in sorted(set(codepoints)):
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return [tuple(coderange) for coderange in ranges]
+
+
+def parse_glyphquery(value: str) -> tuple:
+    """
+    Parses a query, which is either a glyph, a codepoint (U+E5DC, 0xE5DC), a codepoint range (U+E000-U+F8FF)
+    or a combined glyph
+    :param value: query
+    :return: ('codepoints', start, end) or ('combined', glyph)
+    """
+    def codepoint(val):
+        val = val.strip()
+        try:
+            if len(val) > 2 and val[:2].lower() in ('u+', '0x'):
+                return int(val[2:], 16)
+        except ValueError:
+            pass
+        raise ValueError(f"'{val}' is not a codepoint, e.g. U+E5DC or 0xE5DC")
+
+    if len(value) > 2 and value[:2].lower() in ('u+', '0x'):
+        start, _, end = value.partition('-')
+        start = codepoint(start)
+        return 'codepoints', start, codepoint(end) if end else start
+    if len(value) == 1:
+        return 'codepoints', ord(value), ord(value)
+    return 'combined', value
+
+
+class Glyphindex(object):
+    """
+    Answers glyph, codepoint range, combined glyph and guideline rule lookups from an index
+    """
+
+    def __init__(self, fname):
+        if not Path(fname).exists():
+            raise ValueError(f"{fname} is not a glyph index")
+        self.con = sqlite3.connect(f"file:{fname}?mode=ro", uri=True)
+        try:
+            meta = dict(self.con.execute("SELECT key, value FROM meta"))
+        except sqlite3.DatabaseError:
+            raise ValueError(f"{fname} is not a glyph index")
+        if meta.get('version') != str(GLYPHINDEX_VERSION):
+            raise ValueError(f"{fname} has the unsupported index version {meta.get('version')}")
+        self.textnormalization = meta['textnormalization']
+        self.paths = dict(self.con.execute("SELECT fileid, path FROM files"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.con.close()
+
+    @staticmethod
+    def _locations(rows):
+        for key, fileid, positions in rows:
+            positions = array('I', positions)
+            for idx in range(0, len(positions), 2):
+                yield key, fileid, positions[idx], positions[idx + 1]
+
+    def codepoint_locations(self, start: int, end: int):
+        """
+        Yields the locations of all glyphs of a codepoint range
+        :param start: first codepoint
+        :param end: last codepoint
+        :return: tuples of glyph, file id, line and offset
+        """
+        rows = self.con.execute("SELECT codepoint, fileid, positions FROM glyphs WHERE codepoint BETWEEN ? AND ? "
+                                "ORDER BY codepoint, fileid", (start, end))
+        for codepoint, fileid, line, offset in self._locations(rows):
+            yield chr(codepoint), fileid, line, offset
+
+    def combined_locations(self, glyph: str):
+        """
+        Yields the locations of a combined glyph
+        :param glyph: combined glyph
+        :return: tuples of combined glyph, file id, line and offset
+        """
+        rows = self.con.execute("SELECT glyph, fileid, positions FROM combined WHERE glyph = ? ORDER BY fileid",
+                                (glyph,))
+        yield from self._locations(rows)
+
+    def rule_locations(self, guideline: str, guidelines: dict):
+        """
+        Yields the locations of the violations of a guideline. Codepoint rules are looked up in the index,
+        regex rules are matched against the indexed lines.
+        :param guideline: name of the guideline
+        :param guidelines: guidelines instance
+        :return: tuples of violation, file id, line and offset
+        """
+        if guideline not in (guidelines or {}):
+            raise ValueError(f"Unknown guideline {guideline}")
+        for conditionkey, conditions in guidelines[guideline].items():
+            if 'regex' in conditionkey.lower():
+                patterns = [compiled_regex(condition) for condition in conditions]
+                for fileid, line, text in self.con.execute("SELECT fileid, line, text FROM lines "
+                                                           "ORDER BY fileid, line"):
+                    for pattern in patterns:
+                        for match in pattern.finditer(text):
+                            yield match[0], fileid, line, match.start()
+            elif conditionkey.lower().startswith('combined'):
+                for condition in conditions:
+                    yield from self.combined_locations(condition)
+            else:
+                for start, end in codepoint_ranges(condition for condition in conditions
+                                                   if isinstance(condition, int)):
+                    yield from self.codepoint_locations(start, end)
+
+    def line(self, fileid: int, line: int) -> str:
+        """
+        Returns the text of an indexed line
+        :param fileid: file id
+        :param line: line number (starting at 0)
+        :return:
+        """
+        row = self.con.execute("SELECT text FROM lines WHERE fileid = ? AND line = ?", (fileid, line)).fetchone()
+        return row[0] if row else ''
+
+
+def query_glyphindex(fname, queries=(), guideline=None, guidelines=None, limit=0) -> dict:
+    """
+    Looks up the locations of glyphs, codepoint ranges, combined glyphs and guideline violations
+    :param fname: filename of the index
+    :param queries: glyph queries, see parse_glyphquery
+    :param guideline: name of a guideline, whose violations are looked up
+    :param guidelines: guidelines instance
+    :param limit: maximum number of stored locations per query (0 stores all)
+    :return: dict with the query as key and the number of occurrences and the locations as value
+    """
+    results = {}
+    with Glyphindex(fname) as index:
+        lookups = []
+        for query in queries:
+            # Glyphs are looked up in the text normalization of the index
+            parsed = parse_glyphquery(query if query[:2].lower() in ('u+', '0x') else
+                                      unicodedata.normalize(index.textnormalization, query))
+            if parsed[0] == 'codepoints':
+                lookups.append((query, index.codepoint_locations(*parsed[1:])))
+            else:
+                lookups.append((query, index.combined_locations(parsed[1])))
+        if guideline:
+            lookups.append((guideline, index.rule_locations(guideline, guidelines)))
+        for query, locations in lookups:
+            results[query] = {'count': 0, 'locations': []}
+            for glyph, fileid, line, offset in locations:
+                results[query]['count'] += 1
+                if not limit or len(results[query]['locations']) < limit:
+                    results[query]['locations'].append({'glyph': glyph, 'file': index.paths[fileid],
+                                                        'line': line + 1, 'offset': offset + 1,
+                                                        'text': index.line(fileid, line)})
+    return results
+
+
+def print_query(results: dict, count=False) -> None:
+    """
+    Prints the results of a query, the lines and offsets start at 1
+    :param results: query results
+    :param count: prints only the number of occurrences
+    :return:
+    """
+    for query, result in results.items():
+        print(f"{query}: {result['count']} occurrences")
+        if count:
+            continue
+        for location in result['locations']:
+            print(f"\t\u200E{'{'}{location['glyph']}{'}'} {location['file']}:{location['line']}:{location['offset']}"
+                  f"  {location['text']}")
+        if len(result['locations']) < result['count']:
+            print(f"\t... {result['count'] - len(result['locations'])} more")
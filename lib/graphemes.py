@@ -0,0 +1,199 @@
+import pickle
+import re
+from functools import lru_cache
+
+from lib.io import app_path
+
+UCD_PATH = 'profiles/evaluate/UCD'
+GRAPHEME_BREAK_PICKLE = 'graphemebreak.pickle'
+# Increase if the derivation of the break properties changes
+GRAPHEME_BREAK_VERSION = 1
+# First codepoint outside of the basic multilingual plane
+ASTRAL = 0x10000
+# Extended_Pictographic ranges of emoji-data.txt, which is not part of the bundled UCD
+EXTENDED_PICTOGRAPHIC = ((0x00A9, 0x00A9), (0x00AE, 0x00AE), (0x203C, 0x203C), (0x2049, 0x2049),
+                         (0x2122, 0x2122), (0x2139, 0x2139), (0x2194, 0x2199), (0x21A9, 0x21AA),
+                         (0x231A, 0x231B), (0x2328, 0x2328), (0x2388, 0x2388), (0x23CF, 0x23CF),
+                         (0x23E9, 0x23F3), (0x23F8, 0x23FA), (0x24C2, 0x24C2), (0x25AA, 0x25AB),
+                         (0x25B6, 0x25B6), (0x25C0, 0x25C0), (0x25FB, 0x25FE), (0x2600, 0x2605),
+                         (0x2607, 0x2612), (0x2614, 0x2685), (0x2690, 0x2705), (0x2708, 0x2712),
+                         (0x2714, 0x2714), (0x2716, 0x2716), (0x271D, 0x271D), (0x2721, 0x2721),
+                         (0x2728, 0x2728), (0x2733, 0x2734), (0x2744, 0x2744), (0x2747, 0x2747),
+                         (0x274C, 0x274C), (0x274E, 0x274E), (0x2753, 0x2755), (0x2757, 0x2757),
+                         (0x2763, 0x2767), (0x2795, 0x2797), (0x27A1, 0x27A1), (0x27B0, 0x27B0),
+                         (0x27BF, 0x27BF), (0x2934, 0x2935), (0x2B05, 0x2B07), (0x2B1B, 0x2B1C),
+                         (0x2B50, 0x2B50), (0x2B55, 0x2B55), (0x3030, 0x3030), (0x303D, 0x303D),
+                         (0x3297, 0x3297), (0x3299, 0x3299), (0x1F000, 0x1F0FF), (0x1F10D, 0x1F10F),
+                         (0x1F12F, 0x1F12F), (0x1F16C, 0x1F171), (0x1F17E, 0x1F17F), (0x1F18E, 0x1F18E),
+                         (0x1F191, 0x1F19A), (0x1F1AD, 0x1F1E5), (0x1F201, 0x1F20F), (0x1F21A, 0x1F21A),
+                         (0x1F22F, 0x1F22F), (0x1F232, 0x1F23A), (0x1F23C, 0x1F23F), (0x1F249, 0x1F3FA),
+                         (0x1F400, 0x1F53D), (0x1F546, 0x1F64F), (0x1F680, 0x1F6FF), (0x1F774, 0x1F77F),
+                         (0x1F7D5, 0x1F7FF), (0x1F80C, 0x1F80F), (0x1F848, 0x1F84F), (0x1F85A, 0x1F85F),
+                         (0x1F888, 0x1F88F), (0x1F8AE, 0x1F8FF), (0x1F90C, 0x1F93A), (0x1F93C, 0x1F945),
+                         (0x1F947, 0x1FAFF), (0x1FC00, 0x1FFFD))
+
+
+def _read_ucd_file(fname: str):
+    """
+    Yields the fields of the data lines of an UCD file
+    :param fname: name of the UCD file
+    :return:
+    """
+    with open(app_path().joinpath(UCD_PATH, fname), 'r', encoding='utf-8') as fin:
+        for line in fin:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                yield [field.strip() for field in line.split(';')]
+
+
+def _codepoint_range(value: str) -> range:
+    start, _, end = value.partition('..')
+    return range(int(start, 16), int(end or start, 16) + 1)
+
+
+def build_grapheme_break_table() -> dict:
+    """
+    Derives the Grapheme_Cluster_Break property (UAX #29, table 2) from UnicodeData.txt and PropList.txt
+    :return: dict with the break property as key and the sorted codepoint ranges as value
+    """
+    proplist = {}
+    for codepoints, prop in _read_ucd_file('PropList.txt'):
+        if prop in ('Other_Grapheme_Extend', 'Regional_Indicator', 'Prepended_Concatenation_Mark'):
+            for codepoint in _codepoint_range(codepoints):
+                proplist[codepoint] = prop
+    table = {}
+    rangestart = None
+    for fields in _read_ucd_file('UnicodeData.txt'):
+        codepoint, name, category = int(fields[0], 16), fields[1], fields[2]
+        if name.endswith(', First>'):
+            rangestart = codepoint
+            continue
+        codepoints = range(rangestart, codepoint + 1) if name.endswith(', Last>') else (codepoint,)
+        rangestart = None
+        for codepoint in codepoints:
+            if category in ('Mn', 'Me') or proplist.get(codepoint) == 'Other_Grapheme_Extend':
+                table[codepoint] = 'Extend'
+            elif proplist.get(codepoint) == 'Regional_Indicator':
+                table[codepoint] = 'Regional_Indicator'
+            elif proplist.get(codepoint) == 'Prepended_Concatenation_Mark':
+                table[codepoint] = 'Prepend'
+            elif category in ('Zl', 'Zp', 'Cc', 'Cf'):
+                table[codepoint] = 'Control'
+            elif category == 'Mc':
+                table[codepoint] = 'SpacingMark'
+            elif name.startswith('HANGUL CHOSEONG'):
+                table[codepoint] = 'L'
+            elif name.startswith('HANGUL JUNGSEONG'):
+                table[codepoint] = 'V'
+            elif name.startswith('HANGUL JONGSEONG'):
+                table[codepoint] = 'T'
+            elif 0xAC00 <= codepoint <= 0xD7A3:
+                table[codepoint] = 'LV' if (codepoint - 0xAC00) % 28 == 0 else 'LVT'
+    table.update({0x000D: 'CR', 0x000A: 'LF', 0x200C: 'Extend', 0x200D: 'ZWJ', 0x0E33: 'SpacingMark',
+                  0x0EB3: 'SpacingMark'})
+    # Emoji modifiers
+    table.update({codepoint: 'Extend' for codepoint in range(0x1F3FB, 0x1F400)})
+    for start, end in EXTENDED_PICTOGRAPHIC:
+        for codepoint in range(start, end + 1):
+            table.setdefault(codepoint, 'Extended_Pictographic')
+    properties = {}
+    for codepoint in sorted(table):
+        ranges = properties.setdefault(table[codepoint], [])
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return {prop: [tuple(coderange) for coderange in ranges] for prop, ranges in properties.items()}
+
+
+@lru_cache()
+def load_grapheme_break_table() -> dict:
+    """
+    Loads the precomputed break property table, it gets rebuilt if the UCD files are newer
+    :return:
+    """
+    picklepath = app_path().joinpath(UCD_PATH, GRAPHEME_BREAK_PICKLE)
+    sources = [app_path().joinpath(UCD_PATH, fname) for fname in ('UnicodeData.txt', 'PropList.txt')]
+    if picklepath.exists() and all(picklepath.stat().st_mtime >= source.stat().st_mtime for source in sources):
+        try:
+            with open(picklepath, 'rb') as fin:
+                version, table = pickle.load(fin)
+            if version == GRAPHEME_BREAK_VERSION:
+                return table
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            pass
+    table = build_grapheme_break_table()
+    try:
+        with open(picklepath, 'wb') as fout:
+            pickle.dump((GRAPHEME_BREAK_VERSION, table), fout)
+    except OSError:
+        pass
+    return table
+
+
+def _charclass(table: dict, *props, negate=False, bmp=False) -> str:
+    """
+    Builds the character class of break properties. The re module checks astral ranges one by one,
+    therefore they are only tested for astral characters.
+    :param table: break property table
+    :param props: break properties
+    :param negate: negates the class
+    :param bmp: only characters of the basic multilingual plane are matched
+    :return:
+    """
+    ranges = sorted(coderange for prop in props for coderange in table.get(prop, []))
+
+    def _ranges(ranges):
+        return ''.join(re.escape(chr(start)) if start == end else f"{re.escape(chr(start))}-{re.escape(chr(end))}"
+                       for start, end in ranges)
+    bmpclass = _ranges([coderange for coderange in ranges if coderange[1] < ASTRAL])
+    astralclass = _ranges([coderange for coderange in ranges if coderange[0] >= ASTRAL])
+    astral = f"{re.escape(chr(ASTRAL))}-{re.escape(chr(0x10FFFF))}"
+    if negate:
+        if bmp or not astralclass:
+            return f"[^{bmpclass}{astral}]" if bmp else f"[^{bmpclass}]"
+        return f"(?:[^{bmpclass}{astral}]|(?![{astralclass}])[{astral}])"
+    if bmp or not astralclass:
+        return f"[{bmpclass}]" if bmpclass else "(?!)"
+    return f"(?:[{bmpclass}]|(?=[{astral}])[{astralclass}])" if bmpclass else f"[{astralclass}]"
+
+
+@lru_cache()
+def grapheme_cluster_regex():
+    """
+    Compiles the extended grapheme cluster rules of UAX #29 into a regex.
+    Runs of characters, which are followed by a break, are skipped, so only the last character of a run
+    (the possible base of a cluster) and the clusters after it are matched and captured.
+    :return:
+    """
+    table = load_grapheme_break_table()
+    cls = {prop: _charclass(table, prop) for prop in table}
+    # Characters after which is always a break, if they are followed by one of them
+    breaking = _charclass(table, *(prop for prop in table if prop not in ('Control', 'LF')), negate=True, bmp=True)
+    core = (f"(?:{cls['L']}*(?:{cls['V']}+|{cls['LV']}{cls['V']}*|{cls['LVT']}){cls['T']}*|{cls['L']}+|{cls['T']}+"
+            f"|{cls['Regional_Indicator']}{cls['Regional_Indicator']}"
+            f"|{cls['Extended_Pictographic']}(?:{cls['Extend']}*{cls['ZWJ']}{cls['Extended_Pictographic']})*"
+            f"|{_charclass(table, 'Control', 'CR', 'LF', negate=True)})")
+    cluster = (f"\r\n|{cls['Control']}|{cls['CR']}|{cls['LF']}"
+               f"|{cls['Prepend']}*{core}(?:{cls['Extend']}|{cls['ZWJ']}|{cls['SpacingMark']})*"
+               f"|{cls['Prepend']}+")
+    return re.compile(f"(?:{breaking}*(?={breaking}))?({cluster})", re.DOTALL)
+
+
+def grapheme_clusters(text: str) -> list:
+    """
+    Returns the extended grapheme clusters of a text, which consist of more than one codepoint
+    :param text: text
+    :return:
+    """
+    return [cluster for cluster in grapheme_cluster_regex().findall(text) if len(cluster) > 1 and cluster != '\r\n']
+
+
+def grapheme_cluster_spans(text: str) -> list:
+    """
+    Returns the start offsets and the extended grapheme clusters of a text, which consist of more than one codepoint
+    :param text: text
+    :return:
+    """
+    return [(match.start(1), match[1]) for match in grapheme_cluster_regex().finditer(text)
+            if len(match[1]) > 1 and match[1] != '\r\n']
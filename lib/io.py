@@ -1,5 +1,7 @@
+import io
 import json
 import sys
+import unicodedata
 from pathlib import Path
 
 
@@ -7,6 +9,46 @@ def app_path():
     return Path(__file__).parent.parent
 
 
+def normalize_textlines(textlines: list, textnormalization: str) -> list:
+    """
+    Normalizes textlines, lines which pass the normalization quick check are kept as they are
+    :param textlines: textlines
+    :param textnormalization: unicode text normalization
+    :return:
+    """
+    is_normalized = getattr(unicodedata, 'is_normalized', None)
+    if is_normalized is None:
+        return [unicodedata.normalize(textnormalization, textline) for textline in textlines]
+    return [textline if is_normalized(textnormalization, textline) else
+            unicodedata.normalize(textnormalization, textline) for textline in textlines]
+
+
+def read_textlines(fname: Path, textnormalization=None) -> list:
+    """
+    Reads and normalizes the textlines of a text file
+    :param fname: text filename
+    :param textnormalization: unicode text normalization, the lines are not normalized if none is given
+    :return:
+    """
+    with io.open(str(fname.resolve()), 'r', encoding='utf-8') as fin:
+        textlines = fin.read().strip().split('\n')
+    if textnormalization:
+        return normalize_textlines(textlines, textnormalization)
+    return textlines
+
+
+def read_input_textlines(fname: Path) -> tuple:
+    """
+    Reads the textlines of a text, PAGE-XML or ALTO file
+    :param fname: filename
+    :return: list of line identifiers (None for text files) and list of textlines
+    """
+    if fname.suffix.lower() == '.xml':
+        from lib.xmlinput import read_xml_textlines
+        return read_xml_textlines(fname)
+    return None, read_textlines(fname)
+
+
 def open_stream_to(writer, fname: Path):
     """
     Opens a writer stream, if it is already open it closes it first
@@ -27,17 +69,23 @@ def set_output(ctx):
     Sets the output format for the report, if output is None it prints to stdout
     :return:
     """
-    output = ctx.output
-    if not output:
+    if not ctx.output:
         return
-    if not output.parent.exists():
-        output.parent.mkdir()
-    if not output.is_file():
+    output = Path(ctx.output)
+    if output.is_dir() or not output.suffix:
         output = output.joinpath("result.txt")
+    if not output.parent.exists():
+        output.parent.mkdir(parents=True)
     ctx.output = output
     return
 
 
+def _json_default(obj):
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    return str(obj)
+
+
 def create_json(results: dict, output: Path) -> None:
     """
     Prints the results as json
@@ -49,7 +97,7 @@ def create_json(results: dict, output: Path) -> None:
         jout = output.with_suffix(".json").open("w", encoding='utf-8')
     else:
         jout = sys.stdout
-    json.dump(results, jout, indent=4, ensure_ascii=False)
+    json.dump(results, jout, indent=4, ensure_ascii=False, default=_json_default)
     jout.flush()
     jout.close()
     return
@@ -70,9 +118,30 @@ def write_subcounter(reval):
     :return:
     """
     subcountertxt = f"{'*' * 22}\nSubstitutions: " + \
-                    "".join([f"\n\t{count:-{6}}: [{subs}]" for subs, count in reval.substitutiontext.calls.items()]) + \
-                    f"\n{'*' * 22}\n"
+                    "".join([f"\n\t{count:-{6}}: [{subs}]" for subs, count in reval.substitutiontext.calls.items()])
+    if reval.timeouts:
+        subcountertxt += "\nOCR timeouts: " + "".join([f"\n\t{filename}" for filename in reval.timeouts])
+    subcountertxt += f"\n{'*' * 22}\n"
     if reval.verbose:
         print(subcountertxt)
     if reval.logging:
         push_on_textfile(reval.logging, subcountertxt)
+
+
+def write_configsummary(reval):
+    """
+    Prints the ratios and the substitutions of every ocr configuration to the cmd and the log file
+    :param reval: process handler
+    :return:
+    """
+    summarytxt = f"{'*' * 22}\nOCR configurations: "
+    for (lang, psm), stats in reval.configstats.items():
+        ratio = stats['ratio'] / stats['files'] if stats['files'] else 0
+        summarytxt += f"\n\t{lang}:{psm}  files: {stats['files']}  mean ratio: {ratio:.3f}  " \
+                      f"substitutions: {sum(stats['substitutions'].values())}" + \
+                      "".join([f"\n\t\t{count:-{6}}: [{subs}]"
+                               for subs, count in stats['substitutions'].most_common()])
+    summarytxt += f"\n{'*' * 22}\n"
+    print(summarytxt)
+    if reval.logging:
+        push_on_textfile(reval.logging, summarytxt)
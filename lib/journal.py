@@ -0,0 +1,120 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+
+# Number of records and seconds after which the journal gets flushed
+JOURNAL_BATCHSIZE = 256
+JOURNAL_INTERVAL = 10.0
+
+
+def text_hash(text: str) -> str:
+    """
+    Returns the content hash of a text
+    :param text: text
+    :return:
+    """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def journal_filename(shard=None) -> Path:
+    """
+    Returns the default journal filename, every shard gets its own journal
+    :param shard: tuple of shard number and number of shards
+    :return:
+    """
+    if shard:
+        return Path(f"revaluate.shard{shard[0]}of{shard[1]}.journal.jsonl")
+    return Path("revaluate.journal.jsonl")
+
+
+class Revaluationjournal(object):
+    """
+    Records every processed ground truth file of a revaluate run, so an interrupted run can be resumed.
+    The records are appended as json lines and flushed batchwise. Dry runs change no file, so they only read
+    the journal and record nothing, otherwise a later real run would skip the files as completed.
+    """
+
+    def __init__(self, fname: Path, resume=False, batchsize=JOURNAL_BATCHSIZE, interval=JOURNAL_INTERVAL,
+                 dry_run=False):
+        self.fname = Path(fname)
+        self.batchsize = batchsize
+        self.interval = interval
+        self.completed = self.load(self.fname) if resume else {}
+        self._records = []
+        self._lastflush = time.monotonic()
+        self._fout = None if dry_run else self.fname.open('a' if resume else 'w', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def load(fname: Path) -> dict:
+        """
+        Loads the records of a journal, a truncated last record of an interrupted run is ignored
+        :param fname: journal filename
+        :return: dict with the filename as key and the last record as value
+        """
+        completed = {}
+        if not fname.exists():
+            return completed
+        with fname.open('r', encoding='utf-8') as fin:
+            for line in fin:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                completed[record['file']] = record
+        return completed
+
+    def is_completed(self, filename: Path, text: str) -> bool:
+        """
+        Checks if a file was already processed and its ground truth text was not changed since
+        :param filename: gt filename
+        :param text: current content of the file
+        :return:
+        """
+        record = self.completed.get(str(filename.absolute()))
+        if record is None:
+            return False
+        return text_hash(text) == (record['gt_after'] if record['written'] else record['gt_before'])
+
+    def record(self, filename: Path, text: str, revaluated: str, written: bool, ratio=None,
+               substitutions=None) -> None:
+        """
+        Records a processed file
+        :param filename: gt filename
+        :param text: content of the file before the revaluation
+        :param revaluated: revaluated ground truth text
+        :param written: True if the revaluated text was stored
+        :param ratio: similarity ratio of ground truth and ocr
+        :param substitutions: substitution counts of the file
+        :return:
+        """
+        if self._fout is None:
+            return
+        record = {'file': str(filename.absolute()), 'gt_before': text_hash(text), 'gt_after': text_hash(revaluated),
+                  'written': written, 'ratio': ratio, 'substitutions': substitutions or {}}
+        self.completed[record['file']] = record
+        self._records.append(json.dumps(record, ensure_ascii=False))
+        if len(self._records) >= self.batchsize or time.monotonic() - self._lastflush >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the pending records
+        :return:
+        """
+        if self._records and self._fout is not None:
+            self._fout.write('\n'.join(self._records) + '\n')
+            self._fout.flush()
+            self._records = []
+        self._lastflush = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        if self._fout is not None:
+            self._fout.close()
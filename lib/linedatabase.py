@@ -0,0 +1,267 @@
+import sqlite3
+from array import array
+from collections import Counter
+from pathlib import Path
+
+# Number of buffered lines or violations, which are written in one transaction
+LINEDATABASE_BATCHSIZE = 10000
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE files (fileid INTEGER PRIMARY KEY, pid INTEGER, path TEXT);
+CREATE TABLE lines (lineid INTEGER PRIMARY KEY, fileid INTEGER, line INTEGER, identifier TEXT, text TEXT);
+CREATE TABLE glyphs (fileid INTEGER, glyph TEXT, count INTEGER);
+CREATE TABLE violations (lineid INTEGER, condition TEXT, count INTEGER);
+CREATE INDEX lines_fileid ON lines (fileid);
+CREATE INDEX glyphs_glyph ON glyphs (glyph);
+CREATE INDEX violations_lineid ON violations (lineid);
+"""
+
+
+def linedatabase_name(fname, textnormalization: str, multiple=False) -> Path:
+    """
+    Returns the filename of the line database of a text normalization, e.g. lines.NFD.sqlite
+    :param fname: filename of the line database
+    :param textnormalization: unicode text normalization
+    :param multiple: if multiple text normalizations are evaluated, every one gets its own database
+    :return:
+    """
+    fname = Path(fname)
+    return fname.with_suffix(f".{textnormalization}{fname.suffix}") if multiple else fname
+
+
+class _Jsonlines(dict):
+    """
+    Empty dict, which streams the lines of a line database to json.dump instead of holding them in memory
+    """
+
+    def __init__(self, linedatabase):
+        super().__init__()
+        self.linedatabase = linedatabase
+
+    def __len__(self):
+        return len(self.linedatabase)
+
+    def items(self):
+        return self.linedatabase.json_items()
+
+
+class Linedatabase(object):
+    """
+    Stores the files, textlines, glyph counts per file and guideline violations of an evaluation in a sqlite
+    database instead of memory. It provides the interface of the Linestore, the lines are written in batched
+    transactions and read back in pages, so the memory stays flat for any number of lines.
+    """
+
+    def __init__(self, fname, textnormalization='', batchsize=LINEDATABASE_BATCHSIZE):
+        self.fname = Path(fname)
+        self.batchsize = batchsize
+        self.paths = []
+        self.pids = array('I')
+        self._lines = 0
+        self._firstlines = array('Q')
+        self._pending_lines = []
+        self._pending_violations = []
+        if self.fname.exists():
+            self.fname.unlink()
+        self._con = sqlite3.connect(str(self.fname))
+        self._con.execute("PRAGMA journal_mode = OFF")
+        self._con.execute("PRAGMA synchronous = OFF")
+        self._con.executescript(SCHEMA)
+        self._con.execute("INSERT INTO meta VALUES (?, ?)", ('textnormalization', textnormalization))
+        self._con.commit()
+
+    def add_file(self, pid: int, fname: Path, textlines, lineids=None) -> int:
+        """
+        Adds the textlines of a file
+        :param pid: path index of the file
+        :param fname: filename
+        :param textlines: list of textlines
+        :param lineids: optional identifiers of the textlines, e.g. from PAGE-XML
+        :return: file id
+        """
+        textlines = list(textlines)
+        fileid = len(self.paths)
+        self.paths.append(fname)
+        self.pids.append(pid)
+        self._firstlines.append(self._lines)
+        self._con.execute("INSERT INTO files VALUES (?, ?, ?)", (fileid, pid, str(fname)))
+        self._con.executemany("INSERT INTO glyphs VALUES (?, ?, ?)",
+                              [(fileid, glyph, count) for glyph, count in Counter(''.join(textlines)).items()])
+        for linenumber, textline in enumerate(textlines):
+            self._pending_lines.append((self._lines, fileid, linenumber,
+                                        lineids[linenumber] if lineids is not None else None, textline))
+            self._lines += 1
+        if len(self._pending_lines) >= self.batchsize:
+            self.flush()
+        return fileid
+
+    def flush(self) -> None:
+        """
+        Writes the buffered lines and violations in one transaction
+        :return:
+        """
+        if self._pending_lines:
+            self._con.executemany("INSERT INTO lines VALUES (?, ?, ?, ?, ?)", self._pending_lines)
+            self._pending_lines = []
+        if self._pending_violations:
+            self._con.executemany("INSERT INTO violations VALUES (?, ?, ?)", self._pending_violations)
+            self._pending_violations = []
+        self._con.commit()
+
+    def __len__(self):
+        return self._lines
+
+    def __bool__(self):
+        return self._lines > 0
+
+    def _fileid(self, lineid: int) -> int:
+        # The first lines of the files are ascending, so the file of a line is found by bisection
+        lo, hi = 0, len(self._firstlines) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._firstlines[mid] <= lineid:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def _row(self, lineid: int) -> tuple:
+        self.flush()
+        return self._con.execute("SELECT identifier, text FROM lines WHERE lineid = ?", (lineid,)).fetchone()
+
+    def text(self, lineid: int) -> str:
+        """
+        Returns the text of a line
+        :param lineid: line id
+        :return:
+        """
+        return self._row(lineid)[1]
+
+    def location(self, lineid: int) -> tuple:
+        """
+        Returns the filename and the line number (starting at 0) of a line
+        :param lineid: line id
+        :return:
+        """
+        fileid = self._fileid(lineid)
+        return self.paths[fileid], lineid - self._firstlines[fileid]
+
+    def pid(self, lineid: int) -> int:
+        """
+        Returns the path index of a line
+        :param lineid: line id
+        :return:
+        """
+        return self.pids[self._fileid(lineid)]
+
+    def _key(self, lineid: int, identifier) -> str:
+        if identifier is not None:
+            return f"{self.pid(lineid)}:{identifier}"
+        fname, linenumber = self.location(lineid)
+        return f"{self.pid(lineid)}:{fname.name}_{linenumber}"
+
+    def key(self, lineid: int) -> str:
+        """
+        Returns the key of a line in the form '{pid}:{fname}_{idx}' or '{pid}:{line identifier}'
+        :param lineid: line id
+        :return:
+        """
+        return self._key(lineid, self._row(lineid)[0])
+
+    def _pages(self, query: str, params=()):
+        # Reads the rows in pages by line id, so writes between the pages don't disturb the iteration
+        self.flush()
+        lastid = -1
+        while True:
+            rows = self._con.execute(query, (*params, lastid, self.batchsize)).fetchall()
+            if not rows:
+                return
+            yield rows
+            lastid = rows[-1][0]
+
+    def file_texts(self):
+        """
+        Iterates over the text buffers of all files, the textlines are separated by linebreaks
+        :return:
+        """
+        self.flush()
+        for fileid in range(len(self.paths)):
+            yield '\n'.join(text for text, in self._con.execute(
+                "SELECT text FROM lines WHERE fileid = ? ORDER BY lineid", (fileid,)))
+
+    def textlines(self, pid=None):
+        """
+        Iterates over the text of all lines
+        :param pid: only the lines of the files with this path index are returned
+        :return:
+        """
+        if pid is None:
+            rows = self._pages("SELECT lineid, text FROM lines WHERE lineid > ? ORDER BY lineid LIMIT ?")
+        else:
+            rows = self._pages("SELECT lineid, text FROM lines WHERE fileid IN (SELECT fileid FROM files WHERE "
+                               "pid = ?) AND lineid > ? ORDER BY lineid LIMIT ?", (pid,))
+        for page in rows:
+            for _, text in page:
+                yield text
+
+    def items(self):
+        """
+        Iterates over the line ids and the text of all lines
+        :return:
+        """
+        for page in self._pages("SELECT lineid, text FROM lines WHERE lineid > ? ORDER BY lineid LIMIT ?"):
+            yield from page
+
+    def add_violation(self, lineid: int, condition, count: int) -> None:
+        """
+        Adds guideline violations of a line
+        :param lineid: line id
+        :param condition: violated guideline condition or glyph
+        :param count: number of violations
+        :return:
+        """
+        self._pending_violations.append((lineid, condition, count))
+        if len(self._pending_violations) >= self.batchsize:
+            self.flush()
+
+    def glyphs(self, pid=None) -> Counter:
+        """
+        Sums the stored glyph counts of the files
+        :param pid: only the files with this path index are summed
+        :return:
+        """
+        self.flush()
+        query = "SELECT glyph, SUM(count) FROM glyphs"
+        if pid is not None:
+            query += " WHERE fileid IN (SELECT fileid FROM files WHERE pid = ?)"
+        return Counter(dict(self._con.execute(query + " GROUP BY glyph", () if pid is None else (pid,))))
+
+    def json_items(self):
+        """
+        Iterates over the line keys and the line-level dicts {'text': text, 'guideline_violation': {...}}
+        :return:
+        """
+        for page in self._pages("SELECT lineid, identifier, text FROM lines WHERE lineid > ? ORDER BY lineid LIMIT ?"):
+            violations = {}
+            for lineid, condition, count in self._con.execute(
+                    "SELECT lineid, condition, SUM(count) FROM violations WHERE lineid BETWEEN ? AND ? "
+                    "GROUP BY lineid, condition ORDER BY MIN(rowid)", (page[0][0], page[-1][0])):
+                violations.setdefault(lineid, {})[condition] = count
+            for lineid, identifier, text in page:
+                line = {'text': text}
+                if lineid in violations:
+                    line['guideline_violation'] = violations[lineid]
+                yield self._key(lineid, identifier), line
+
+    def to_dict(self) -> dict:
+        """
+        Converts the store to the line-level dict, which is streamed from the database by json.dump
+        :return:
+        """
+        return _Jsonlines(self)
+
+    def close(self) -> None:
+        self.flush()
+        self._con.execute("CREATE INDEX IF NOT EXISTS violations_condition ON violations (condition)")
+        self._con.commit()
+        self._con.close()
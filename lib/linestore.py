@@ -0,0 +1,145 @@
+from array import array
+from collections import defaultdict
+from pathlib import Path
+
+
+class Linestore(object):
+    """
+    Stores the textlines of all files compactly: one text buffer per file and integer offset arrays per line.
+    Lines are addressed by a global line id, which maps in O(1) to the file and the line number.
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.pids = array('I')
+        self.violations = defaultdict(lambda: defaultdict(int))
+        self._buffers = []
+        self._firstlines = array('Q')
+        self._fileids = array('I')
+        self._starts = array('Q')
+        self._ends = array('Q')
+        self._lineids = {}
+
+    def add_file(self, pid: int, fname: Path, textlines, lineids=None) -> int:
+        """
+        Adds the textlines of a file
+        :param pid: path index of the file
+        :param fname: filename
+        :param textlines: list of textlines
+        :param lineids: optional identifiers of the textlines, e.g. from PAGE-XML
+        :return: file id
+        """
+        textlines = list(textlines)
+        fileid = len(self.paths)
+        self.paths.append(fname)
+        self.pids.append(pid)
+        self._firstlines.append(len(self._starts))
+        if lineids is not None:
+            for idx, lineid in enumerate(lineids):
+                self._lineids[len(self._starts) + idx] = lineid
+        start = 0
+        for textline in textlines:
+            self._fileids.append(fileid)
+            self._starts.append(start)
+            start += len(textline)
+            self._ends.append(start)
+            start += 1
+        self._buffers.append('\n'.join(textlines))
+        return fileid
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __bool__(self):
+        return len(self._starts) > 0
+
+    def text(self, lineid: int) -> str:
+        """
+        Returns the text of a line
+        :param lineid: line id
+        :return:
+        """
+        return self._buffers[self._fileids[lineid]][self._starts[lineid]:self._ends[lineid]]
+
+    def location(self, lineid: int) -> tuple:
+        """
+        Returns the filename and the line number (starting at 0) of a line
+        :param lineid: line id
+        :return:
+        """
+        fileid = self._fileids[lineid]
+        return self.paths[fileid], lineid - self._firstlines[fileid]
+
+    def pid(self, lineid: int) -> int:
+        """
+        Returns the path index of a line
+        :param lineid: line id
+        :return:
+        """
+        return self.pids[self._fileids[lineid]]
+
+    def key(self, lineid: int) -> str:
+        """
+        Returns the key of a line in the form '{pid}:{fname}_{idx}' or '{pid}:{line identifier}'
+        :param lineid: line id
+        :return:
+        """
+        fname, linenumber = self.location(lineid)
+        pid = self.pid(lineid)
+        if lineid in self._lineids:
+            return f"{pid}:{self._lineids[lineid]}"
+        return f"{pid}:{fname.name}_{linenumber}"
+
+    def file_texts(self):
+        """
+        Iterates over the text buffers of all files, the textlines are separated by linebreaks
+        :return:
+        """
+        return iter(self._buffers)
+
+    def textlines(self, pid=None):
+        """
+        Iterates over the text of all lines
+        :param pid: only the lines of the files with this path index are returned
+        :return:
+        """
+        for _, text in self._lines(pid):
+            yield text
+
+    def items(self):
+        """
+        Iterates over the line ids and the text of all lines
+        :return:
+        """
+        return self._lines()
+
+    def _lines(self, pid=None):
+        # The lines are sliced by their offsets, textlines may contain linebreaks themselves
+        for fileid, buffer in enumerate(self._buffers):
+            if pid is not None and self.pids[fileid] != pid:
+                continue
+            lastline = self._firstlines[fileid + 1] if fileid + 1 < len(self._firstlines) else len(self._starts)
+            for lineid in range(self._firstlines[fileid], lastline):
+                yield lineid, buffer[self._starts[lineid]:self._ends[lineid]]
+
+    def add_violation(self, lineid: int, condition, count: int) -> None:
+        """
+        Adds guideline violations of a line
+        :param lineid: line id
+        :param condition: violated guideline condition or glyph
+        :param count: number of violations
+        :return:
+        """
+        self.violations[lineid][condition] += count
+
+    def to_dict(self) -> dict:
+        """
+        Converts the store to the line-level dict {key: {'text': text, 'guideline_violation': {...}}}
+        :return:
+        """
+        lines = {}
+        for lineid, text in self.items():
+            lines[self.key(lineid)] = {'text': text}
+            if lineid in self.violations:
+                lines[self.key(lineid)]['guideline_violation'] = dict(self.violations[lineid])
+        return lines
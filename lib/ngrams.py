@@ -0,0 +1,163 @@
+import hashlib
+import heapq
+import math
+from array import array
+from collections import Counter, OrderedDict
+
+# Number of characters which are collected before a batch gets counted
+NGRAM_BATCHSIZE = 2 ** 20
+# Number of reported n-grams per size
+NGRAM_TOPK = 50
+# Count-Min sketch with an overestimation of at most e/width * N with a probability of 1 - e^-depth
+SKETCH_WIDTH = 2 ** 18
+SKETCH_DEPTH = 4
+
+
+def count_ngrams(text: str, size: int) -> Counter:
+    """
+    Counts the character n-grams of a text, n-grams across linebreaks are not counted
+    :param text: text, the textlines are separated by linebreaks
+    :param size: n-gram size
+    :return:
+    """
+    ngrams = Counter(map(''.join, zip(*[text[idx:] for idx in range(size)])))
+    for ngram in [ngram for ngram in ngrams if '\n' in ngram]:
+        del ngrams[ngram]
+    return ngrams
+
+
+class Countminsketch(object):
+    """
+    Approximates the counts of a stream of keys in a fixed amount of memory, the counts are never underestimated
+    """
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._rows = [array('Q', bytes(8 * width)) for _ in range(depth)]
+
+    def _cells(self, key: str):
+        # One digest provides the hashes of all rows, it is stable across processes, so sketches can be merged
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.depth).digest()
+        return [(row, int.from_bytes(digest[4 * idx:4 * idx + 4], 'little') % self.width)
+                for idx, row in enumerate(self._rows)]
+
+    def add(self, key: str, count=1) -> None:
+        """
+        Adds the occurrences of a key
+        :param key: key
+        :param count: number of occurrences
+        :return:
+        """
+        self.total += count
+        for row, cell in self._cells(key):
+            row[cell] += count
+
+    def count(self, key: str) -> int:
+        """
+        Returns the estimated count of a key
+        :param key: key
+        :return:
+        """
+        return min(row[cell] for row, cell in self._cells(key))
+
+    def merge(self, other) -> None:
+        """
+        Adds the counts of another sketch of the same size
+        :param other: sketch
+        :return:
+        """
+        self.total += other.total
+        for row, otherrow in zip(self._rows, other._rows):
+            for cell, count in enumerate(otherrow):
+                if count:
+                    row[cell] += count
+
+    def error(self) -> int:
+        """
+        Returns the maximum overestimation of a count with a probability of 1 - e^-depth
+        :return:
+        """
+        return math.ceil(math.e / self.width * self.total)
+
+
+class Ngramcounter(object):
+    """
+    Counts the character n-grams of textlines batchwise. The exact mode keeps all n-grams,
+    the sketch mode keeps only the heavy hitters (top-k) of a Count-Min sketch in bounded memory.
+    """
+
+    def __init__(self, sizes=(2, 3), mode='exact', topk=NGRAM_TOPK, batchsize=NGRAM_BATCHSIZE):
+        self.sizes = sorted(set(sizes))
+        self.mode = mode
+        self.topk = topk
+        self.batchsize = batchsize
+        self.counts = {size: Counter() for size in self.sizes}
+        self.sketches = {size: Countminsketch() for size in self.sizes} if mode == 'sketch' else {}
+        self._batch = []
+        self._batchlen = 0
+
+    def update(self, textlines) -> None:
+        """
+        Adds multiple textlines to the current batch
+        :param textlines: iterable of textlines
+        :return:
+        """
+        for textline in textlines:
+            self._batch.append(textline)
+            self._batchlen += len(textline) + 1
+            if self._batchlen >= self.batchsize:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Counts the current batch
+        :return:
+        """
+        if not self._batch:
+            return
+        text = '\n'.join(self._batch)
+        self._batch = []
+        self._batchlen = 0
+        for size in self.sizes:
+            ngrams = count_ngrams(text, size)
+            if self.mode != 'sketch':
+                self.counts[size].update(ngrams)
+                continue
+            for ngram, count in ngrams.items():
+                self.sketches[size].add(ngram, count)
+            self._keep_heavy_hitters(size, ngrams)
+
+    def _keep_heavy_hitters(self, size: int, candidates) -> None:
+        sketch = self.sketches[size]
+        estimates = [(ngram, sketch.count(ngram)) for ngram in set(self.counts[size]).union(candidates)]
+        self.counts[size] = Counter(dict(heapq.nlargest(self.topk, estimates, key=lambda item: item[1])))
+
+    def merge(self, other) -> None:
+        """
+        Adds the n-grams of another n-gram counter with the same sizes and mode
+        :param other: n-gram counter
+        :return:
+        """
+        self.flush()
+        other.flush()
+        for size in self.sizes:
+            if self.mode != 'sketch':
+                self.counts[size].update(other.counts[size])
+                continue
+            self.sketches[size].merge(other.sketches[size])
+            self._keep_heavy_hitters(size, other.counts[size])
+
+    def to_results(self, res_combined) -> None:
+        """
+        Stores the most common n-grams in the results instance (all n-grams if topk is 0)
+        :param res_combined: results['combined'] instance
+        :return:
+        """
+        self.flush()
+        res_combined['ngrams'] = OrderedDict((f"{size}-gram", OrderedDict(self.counts[size].most_common(
+            self.topk or None))) for size in self.sizes)
+        if self.mode == 'sketch':
+            # The sketch counts are upper bounds, their maximum overestimation is reported along
+            res_combined['ngram errors'] = {f"{size}-gram": self.sketches[size].error() for size in self.sizes}
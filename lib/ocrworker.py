@@ -0,0 +1,125 @@
+import multiprocessing
+
+try:
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    print("Revaluation is not available. Please install tesserocr.")
+
+# Seconds per image until the engine gets killed (0 disables the time budget)
+OCR_TIMEOUT = 60
+# Number of images after which the engine gets replaced
+OCR_RECYCLE = 1000
+
+
+class OCRTimeout(Exception):
+    """
+    The engine exceeded the time budget for an image
+    """
+
+
+def _ocr_loop(conn, configs) -> None:
+    """
+    Recognizes the images, which are sent through the connection, until it receives None.
+    Every image is decoded once and recognized by the engines of all configurations.
+    :param conn: connection to the parent process
+    :param configs: list of tuples of tesseract language model and pagesegmentation mode
+    :return:
+    """
+    apis = [PyTessBaseAPI(psm=psm, lang=lang) for lang, psm in configs]
+    try:
+        while True:
+            imgname = conn.recv()
+            if imgname is None:
+                break
+            if len(apis) == 1:
+                apis[0].SetImageFile(imgname)
+                conn.send([apis[0].GetUTF8Text()])
+                continue
+            from PIL import Image
+            with Image.open(imgname) as image:
+                image.load()
+                texts = []
+                for api in apis:
+                    api.SetImage(image)
+                    texts.append(api.GetUTF8Text())
+            conn.send(texts)
+    finally:
+        for api in apis:
+            api.End()
+        conn.close()
+
+
+class Ocrworker(object):
+    """
+    Runs the tesseract engines in a separate process, so it can be killed if an image exceeds the time budget.
+    The process is replaced after a number of images to avoid memory creep.
+    """
+
+    def __init__(self, configs, timeout=OCR_TIMEOUT, recycle=OCR_RECYCLE):
+        self.configs = list(configs)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.images = 0
+        self.restarts = 0
+        self._process = None
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self) -> None:
+        self._conn, childconn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_ocr_loop, args=(childconn, self.configs), daemon=True)
+        self._process.start()
+        childconn.close()
+        self.images = 0
+
+    def _kill(self) -> None:
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process, self._conn = None, None
+        self.restarts += 1
+
+    def ocr(self, imgname) -> list:
+        """
+        Recognizes the text of an image with every configuration
+        :param imgname: image filename
+        :return: list of the texts in the order of the configurations
+        """
+        if self._process is not None and self.recycle and self.images >= self.recycle:
+            self.close()
+        if self._process is None:
+            self._start()
+        self.images += 1
+        try:
+            self._conn.send(str(imgname))
+            if self._conn.poll(self.timeout or None):
+                return self._conn.recv()
+        except (EOFError, OSError):
+            # The engine crashed
+            self._kill()
+            raise OCRTimeout(f"The engine crashed on {imgname}")
+        self._kill()
+        raise OCRTimeout(f"The engine exceeded {self.timeout}s on {imgname}")
+
+    def close(self) -> None:
+        """
+        Stops the engine process
+        :return:
+        """
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(5)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+        self._process, self._conn = None, None
@@ -1,14 +1,22 @@
-from collections import defaultdict
+import hashlib
+from collections import defaultdict, Counter
 from pathlib import Path
 
 from lib.io import open_stream_to
 from lib.settings import load_profiles
 
 
+# Filename patterns of the input formats, xml covers PAGE-XML and ALTO
+INPUT_PATTERNS = {'txt': ("*.txt",), 'xml': ("*.xml",), 'all': ("*.txt", "*.xml")}
+
+
 class Processhandler(object):
 
-    def __init__(self, fpaths, output, guideline, guidelinespath, textnormalization, verbose):
-        self.files = self._get_filenames(fpaths)
+    def __init__(self, fpaths, output, guideline, guidelinespath, textnormalization, verbose,
+                 shard=None, sharding='size', patterns=("*.txt",)):
+        self.files = self._get_filenames(fpaths, patterns)
+        if shard:
+            self.files = self._shard_filenames(self.files, *shard, sharding=sharding)
         self.current_file = None
         self.output = output
         self.guideline = guideline
@@ -17,17 +25,46 @@ class Processhandler(object):
         self.verbose = verbose
 
     @staticmethod
-    def _get_filenames(fpaths):
+    def _get_filenames(fpaths, patterns=("*.txt",)):
         files = defaultdict(list)
         for fpath in fpaths:
             fpath = Path(fpath)
             if not fpath.is_file():
-                for fname in sorted(fpath.rglob("*.txt")):
+                for fname in sorted(set(fname for pattern in patterns for fname in fpath.rglob(pattern))):
                     files[fname.parent].append(fname)
             else:
                 files[fpath.parent].append(fpath)
         return files
 
+    @staticmethod
+    def _shard_filenames(files, shard, shards, sharding='size'):
+        """
+        Keeps only the files of one shard, every invocation with the same input computes the same partition
+        :param files: files per directory
+        :param shard: number of the shard (1 to shards)
+        :param shards: number of shards
+        :param sharding: 'hash' assigns by a stable path hash, 'size' balances the byte volume per shard
+        :return:
+        """
+        fnames = [fname for fnames in files.values() for fname in fnames]
+        if sharding == 'hash':
+            assignment = {fname: int(hashlib.md5(fname.as_posix().encode('utf-8')).hexdigest(), 16) % shards
+                          for fname in fnames}
+        else:
+            # Greedy assignment of the largest files to the shard with the least bytes
+            assignment, volumes = {}, [0] * shards
+            for size, fname in sorted([(fname.stat().st_size, fname) for fname in fnames],
+                                      key=lambda sizefname: (-sizefname[0], sizefname[1].as_posix())):
+                lightest = volumes.index(min(volumes))
+                assignment[fname] = lightest
+                volumes[lightest] += size
+        shardfiles = defaultdict(list)
+        for fpath, fnames in files.items():
+            for fname in fnames:
+                if assignment[fname] == shard - 1:
+                    shardfiles[fpath].append(fname)
+        return shardfiles
+
     def num_filenames(self):
         return len(self.files)
 
@@ -39,23 +76,49 @@ class Processhandler(object):
 class Evaluatehandler(Processhandler):
 
     def __init__(self, fpaths, output, json, custom_categories, statistical_categories,
-                 addinfo, guideline, textnormalization, log, verbose):
+                 addinfo, guideline, textnormalization, engine, log, verbose, shard=None, sharding='size',
+                 input_format='txt'):
         self.fout = None
         self.orig_fname = None
         self.json = json
         self.statistical_categories = statistical_categories
         self.custom_categories = custom_categories
         self.addinfo = addinfo
+        self.engine = engine
+        self.sample = None
         self.logging = None
         self.log = log
-        super().__init__(fpaths, output, guideline, "profiles/evaluate/guidelines", textnormalization, verbose)
+        self.textnormalizations = [textnormalization] if isinstance(textnormalization, str) \
+            else list(dict.fromkeys(textnormalization))
+        super().__init__(fpaths, output, guideline, "profiles/evaluate/guidelines", self.textnormalizations[0],
+                         verbose, shard, sharding, INPUT_PATTERNS[input_format])
+
+
+class Mergehandler(Evaluatehandler):
+
+    def __init__(self, snapshots, output, json, custom_categories, statistical_categories,
+                 addinfo, guideline, textnormalization, verbose):
+        self.snapshots = [Path(snapshot) for snapshot in snapshots]
+        super().__init__((), output, json, custom_categories, statistical_categories,
+                         addinfo, guideline, textnormalization, 'python', False, verbose)
+
+    def set_files(self, path_indexes):
+        self.files = {fpath: [] for fpath in path_indexes.values()}
 
 
 class Revaluatehandler(Processhandler):
     def __init__(self, fpaths, output,
                  lang, psm, diffratio, guideline,
-                 textnormalization, substitutiontext, delete_suspicous, log, verbose):
+                 textnormalization, substitutiontext, delete_suspicous, log, verbose, shard=None, sharding='size',
+                 configs=None):
         self.filecounter = 0
+        self.configs = list(configs) if configs else [(lang, psm)]
+        self.configstats = {config: {'files': 0, 'ratio': 0.0, 'substitutions': Counter()} for config in self.configs}
+        self.ratio = None
+        self.substitutions = Counter()
+        self.writeback = None
+        self.ocrworker = None
+        self.timeouts = []
         self.diffratio = diffratio
         self.difflogging = None
         self.lang = lang
@@ -64,7 +127,8 @@ class Revaluatehandler(Processhandler):
         self.delete_suspicous = delete_suspicous
         self.log = log
         self.substitutiontext = substitutiontext
-        super().__init__(fpaths, output, guideline, "profiles/revaluate/guidelines", textnormalization, verbose)
+        super().__init__(fpaths, output, guideline, "profiles/revaluate/guidelines", textnormalization, verbose,
+                         shard, sharding)
 
     def update_logger(self):
         if self.diffratio:
@@ -78,6 +142,20 @@ class Revaluatehandler(Processhandler):
         for logger in [self.difflogging, self.logging]:
             logger.close()
 
+    def update_configstats(self, config, ratio, substitutions):
+        """
+        Adds the ratio and the substitutions of a file to the statistics of an ocr configuration
+        :param config: tuple of language model and pagesegmentation mode
+        :param ratio: similarity ratio of ground truth and ocr
+        :param substitutions: substitution counts
+        :return:
+        """
+        if ratio is None:
+            return
+        self.configstats[config]['files'] += 1
+        self.configstats[config]['ratio'] += ratio
+        self.configstats[config]['substitutions'].update(substitutions)
+
     @staticmethod
     def write_log(logging, msg):
         if logging:
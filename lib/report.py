@@ -4,7 +4,7 @@ from collections import defaultdict
 from typing import DefaultDict
 
 from lib.evaluation import controlcharacter_check
-from lib.functools import get_defaultdict
+from lib.graphemes import grapheme_clusters
 
 
 def print_unicodeinfo(evalu, val, key) -> str:
@@ -17,7 +17,8 @@ def print_unicodeinfo(evalu, val, key) -> str:
     """
     # The \u200E is the LR Mark so the text is rendered from left to right even if the next symbol is RL
     if isinstance(val, int):
-        return f"\u200E{val:-{6}}  {'{'}{repr(key) if controlcharacter_check(key) else key}{'}'}{addinfo(evalu, key)}"
+        return f"\u200E{estimated(evalu, val):>{6}}  " \
+               f"{'{'}{repr(key) if controlcharacter_check(key) else key}{'}'}{addinfo(evalu, key)}"
     elif isinstance(val, str) and len(unicodedata.normalize('NFD', val)) == 2:
         val = unicodedata.normalize('NFD', val)
         return f"\u200E{'{'}{repr(key) if controlcharacter_check(key) else key}{'}'} " \
@@ -29,6 +30,16 @@ def print_unicodeinfo(evalu, val, key) -> str:
                f"U+{str(val).replace('0x', '').zfill(4)} {int(val, 16)}{addinfo(evalu, key)}"
 
 
+def estimated(evalu, val) -> str:
+    """
+    Marks the counts of a sample evaluation as estimates
+    :param evalu: process handler
+    :param val: count
+    :return:
+    """
+    return f"~{val}" if getattr(evalu, 'sample', None) else f"{val}"
+
+
 def addinfo(evalu, key) -> str:
     """
     Adds info to the single unicode statistics like the hexa code or the unicodename
@@ -38,15 +49,12 @@ def addinfo(evalu, key) -> str:
     """
     info = ' '
     if len(key) > 1:
-        if len(key) == 2:
+        if len(key) == 2 or grapheme_clusters(key) == [key]:
             if 'code' in evalu.addinfo:
-                try:
-                    info += f"{str(hex(ord(key[0])))} - {str(hex(ord(key[1])))} "
-                except ValueError:
-                    info += f"NO NAME IS AVAILABLE FOR {key}"
+                info += f"{' - '.join(str(hex(ord(glyph))) for glyph in key)} "
             if 'name' in evalu.addinfo:
                 try:
-                    info += f"{unicodedata.name(key[0])} - {unicodedata.name(key[1])}"
+                    info += ' - '.join(unicodedata.name(glyph) for glyph in key)
                 except ValueError:
                     info += f"NO NAME IS AVAILABLE FOR {key}"
         elif controlcharacter_check(key):
@@ -132,40 +140,11 @@ def sum_statistics(result: DefaultDict, section: str) -> int:
     :param section: section to sum
     :return:
     """
+    if section in result.get('sum', {}):
+        return result['sum'][section]['sum']
     return sum([val for subsection in result[section].values() for val in subsection.values()])
 
 
-def summarize(results: DefaultDict, category: str) -> None:
-    """
-    Summarizes the results of multiple input data
-    :param results: results instance
-    :param category: category
-    :return:
-    """
-    if category in results:
-        get_defaultdict(results, 'sum')
-        results['sum']['sum'] = results['sum'].get('sum', 0)
-        get_defaultdict(results['sum'], category)
-        results['sum'][category]['sum'] = 0
-        for sectionkey, sectionval in results[category].items():
-            get_defaultdict(results['sum'][category], sectionkey)
-            results['sum'][category][sectionkey]['sum'] = 0
-            if isinstance(list(sectionval.values())[0], dict):
-                for subsectionkey, subsectionval in sorted(sectionval.items()):
-                    get_defaultdict(results['sum'][category][sectionkey], subsectionkey)
-                    intermediate_sum = sum(subsectionval.values())
-                    results['sum'][category][sectionkey][subsectionkey]['sum'] = intermediate_sum
-                    results['sum'][category][sectionkey]['sum'] += intermediate_sum
-                    results['sum'][category]['sum'] += intermediate_sum
-                    results['sum']['sum'] += intermediate_sum
-            else:
-                intermediate_sum = sum(sectionval.values())
-                results['sum'][category][sectionkey]['sum'] = intermediate_sum
-                results['sum'][category]['sum'] += intermediate_sum
-                results['sum']['sum'] += intermediate_sum
-    return
-
-
 def get_nested_val(ndict, keys, default=0):
     """
     Returns a value or the default value for a key in a nested dictionary
@@ -185,51 +164,159 @@ def get_nested_val(ndict, keys, default=0):
     return val
 
 
-def create_report(result: DefaultDict, evalu) -> None:
+def open_report(evalu) -> None:
     """
-    Creates the report
-    :param result: results instance
+    Opens the report output and writes the report header
     :param evalu: evaluation processhandler
     :return:
     """
-    fpoint = 10
     fnames = '; '.join(set([str(fpath.resolve()) for fpath in evalu.files.keys()]))
-    path_indexes = result['path_indexes']
-    del result['path_indexes']
     if not evalu.output:
         evalu.fout = sys.stdout
     else:
         evalu.fout = open(evalu.output, 'w')
     evalu.fout.write(f"""
     Analyse-Report Version 0.1
-    Input: {fnames}
+    Input: {fnames}""")
+    if evalu.sample:
+        evalu.fout.write(f"""
+    Sample: {evalu.sample['size']} of {evalu.sample['population']} {evalu.sample['unit']} """
+                         f"""(seed {evalu.sample['seed']}), counts marked with ~ are estimates""")
+    evalu.fout.write(f"""
     \n{"-" * 60}\n""")
+    return
+
+
+def close_report(evalu) -> None:
+    """
+    Flushes and closes the report output
+    :param evalu: evaluation processhandler
+    :return:
+    """
+    evalu.fout.flush()
+    if evalu.fout != sys.stdout:
+        evalu.fout.close()
+    return
+
+
+def create_report(result: DefaultDict, evalu) -> None:
+    """
+    Creates the report
+    :param result: results instance
+    :param evalu: evaluation processhandler
+    :return:
+    """
+    open_report(evalu)
+    report_results(result, evalu)
+    close_report(evalu)
+    return
+
+
+def create_normalization_report(results: dict, evalu) -> None:
+    """
+    Creates one report with the sections of every text normalization and their differences
+    :param results: results instances per text normalization
+    :param evalu: evaluation processhandler
+    :return:
+    """
+    open_report(evalu)
+    for textnormalization, result in results.items():
+        evalu.fout.write(f"""
+    {"=" * 60}
+    Text normalization: {textnormalization}
+    {"=" * 60}\n""")
+        report_results(result, evalu)
+    report_normalization_differences(evalu.fout, results, evalu)
+    close_report(evalu)
+    return
+
+
+def report_normalization_differences(fout, results: dict, evalu) -> None:
+    """
+    Reports the glyphs, combined glyphs and guideline violations which differ between the text normalizations
+    :param fout: output stream
+    :param results: results instances per text normalization
+    :param evalu: evaluation processhandler
+    :return:
+    """
+    textnormalizations = list(results.keys())
+    fout.write(f"""
+    Text normalization differences ({', '.join(textnormalizations)})
+    """)
+    for section in ['glyph', 'combined glyph']:
+        counts = {textnormalization: result['combined']['all'][section]
+                  for textnormalization, result in results.items()}
+        glyphs = sorted(set().union(*[count.keys() for count in counts.values()]))
+        differences = [glyph for glyph in glyphs if len(set([count.get(glyph, 0) for count in counts.values()])) > 1]
+        fout.write(f"""
+        {section.capitalize()}
+        {"-" * len(section)}""")
+        if not differences:
+            fout.write("""
+                            No differences""")
+        for glyph in differences:
+            occurrences = '  '.join([f"{textnormalization}: {counts[textnormalization].get(glyph, 0):-{6}}"
+                                     for textnormalization in textnormalizations])
+            fout.write(f"""
+                            \u200E{occurrences}  {'{'}{repr(glyph) if controlcharacter_check(glyph) else glyph}{'}'}"""
+                       f"""{addinfo(evalu, glyph)}""")
+    if evalu.guideline:
+        violations = []
+        for textnormalization, result in results.items():
+            violation_sum = sum_statistics(result['guidelines'], evalu.guideline) \
+                if evalu.guideline in result['guidelines'] else 0
+            violations.append(f"{textnormalization}: {violation_sum}")
+        violations = '  '.join(violations)
+        fout.write(f"""
+
+        {evalu.guideline} guideline violations
+        {"-" * (len(evalu.guideline) + 21)}
+                            {violations}""")
+    fout.write(f"""
+    \n{"-" * 60}\n""")
+    return
+
+
+def report_results(result: DefaultDict, evalu) -> None:
+    """
+    Writes the statistic sections of a results instance into the report
+    :param result: results instance
+    :param evalu: evaluation processhandler
+    :return:
+    """
+    fpoint = 10
+    if 'path_indexes' in result:
+        del result['path_indexes']
     if 'combined' in result.keys():
+        def category_sum(*keys):
+            return estimated(evalu, get_nested_val(result, ['combined', 'cat', 'sum', *keys]))
         subheader = f"""
-        {get_nested_val(result, ['combined', 'cat', 'sum', 'Z', 'SPACE', 'Zs', 'sum']):-{fpoint}} ASCII Spacing Symbols
-        {get_nested_val(result, ['combined', 'cat', 'sum', 'N', 'DIGIT', 'Nd', 'sum']):-{fpoint}} ASCII Digits
-        {get_nested_val(result, ['combined', 'cat', 'sum', 'L', 'LATIN', 'sum']):-{fpoint}} ASCII Letters
-        {get_nested_val(result, ['combined', 'cat', 'sum', 'L', 'LATIN', 'Ll', 'sum']):-{fpoint}} ASCII Lowercase Letters
-        {get_nested_val(result, ['combined', 'cat', 'sum', 'L', 'LATIN', 'Lu', 'sum']):-{fpoint}} ASCII Uppercase Letters
-        {get_nested_val(result, ['combined', 'cat', 'sum', 'P', 'sum']):-{fpoint}} Punctuation & Symbols
-        {get_nested_val(result, ['combined', 'cat', 'sum', 'sum']):-{fpoint}} Total Glyphs
+        {category_sum('Z', 'SPACE', 'Zs', 'sum'):>{fpoint}} ASCII Spacing Symbols
+        {category_sum('N', 'DIGIT', 'Nd', 'sum'):>{fpoint}} ASCII Digits
+        {category_sum('L', 'LATIN', 'sum'):>{fpoint}} ASCII Letters
+        {category_sum('L', 'LATIN', 'Ll', 'sum'):>{fpoint}} ASCII Lowercase Letters
+        {category_sum('L', 'LATIN', 'Lu', 'sum'):>{fpoint}} ASCII Uppercase Letters
+        {category_sum('P', 'sum'):>{fpoint}} Punctuation & Symbols
+        {category_sum('sum'):>{fpoint}} Total Glyphs
     """
         report_subsection(evalu.fout, 'L', defaultdict(str), evalu, header='Statistics combined', subheaderinfo=subheader)
     if evalu.guideline in result['guidelines'].keys():
         violations = sum_statistics(result['guidelines'], evalu.guideline)
         report_subsection(evalu.fout, evalu.guideline, result['guidelines'], evalu,
                           header=f"{evalu.guideline} Guidelines Evaluation",
-                          subheaderinfo=f"Guideline violations combined: {violations}")
+                          subheaderinfo=f"Guideline violations combined: {estimated(evalu, violations)}")
     for category in evalu.custom_categories:
         if category in result['combined']['usr'].keys():
             occurences = sum_statistics(result['combined']['usr'], category)
             report_subsection(evalu.fout, category, result['combined']['usr'], evalu,
                               header=f"Category statistics: {category}",
-                              subheaderinfo=f"Overall occurrences: {occurences}")
+                              subheaderinfo=f"Overall occurrences: {estimated(evalu, occurences)}")
     if 'combined' in result.keys():
         if 'all' in evalu.statistical_categories:
             result['combined']['all']['glyph'] = dict(result['combined']['all']['glyph'].most_common())
             report_subsection(evalu.fout, 'all', result['combined'], evalu, header='Unicode glyph statistics')
+        if 'ngrams' in result['combined'].keys():
+            report_ngrams(evalu.fout, result['combined'], evalu)
         for cat in set(evalu.statistical_categories).intersection(set(result['combined'].keys())):
             if cat in ['all', 'sum']:
                 continue
@@ -245,8 +332,108 @@ def create_report(result: DefaultDict, evalu) -> None:
             for cat in result['combined']['missing'].keys():
                 report_subsection(evalu.fout, cat, result['combined']['missing'], evalu,
                                   header=f"Missing characters for profile '{cat}'")
+    if 'duplicates' in result:
+        report_duplicates(evalu.fout, result['duplicates'])
+    if 'estimates' in result:
+        report_estimates(evalu.fout, result['estimates'], evalu)
+    for dataset in result.get('datasets', {}).values():
+        fpath = next(iter(dataset['path_indexes'].values()))
+        evalu.fout.write(f"""
+    {"=" * 60}
+    Dataset: {fpath}
+    {"=" * 60}\n""")
+        report_results(dataset, evalu)
+    return
 
-    evalu.fout.flush()
-    if evalu.fout != sys.stdout:
-        evalu.fout.close()
+
+def report_estimates(fout, estimates: dict, evalu) -> None:
+    """
+    Reports the estimates of a sample evaluation with their 95% confidence intervals and the sample counts
+    :param fout: output stream
+    :param estimates: estimates instance
+    :param evalu: evaluation processhandler
+    :return:
+    """
+    fout.write("""
+    Sample estimates (95% confidence intervals)
+    """)
+    for section, sectionestimates in estimates.items():
+        if not sectionestimates:
+            continue
+        title = f"{evalu.guideline} guideline violations" if section == 'guidelines' else section.capitalize()
+        fout.write(f"""
+        {title}
+        {"-" * len(title)}""")
+        for key, estimate in sectionestimates.items():
+            interval = f"{estimate['ci'][0]}-{estimate['ci'][1]}" if estimate['ci'] else "n/a"
+            if section in ['glyph', 'combined glyph']:
+                key = f"{'{'}{repr(key) if controlcharacter_check(key) else key}{'}'}{addinfo(evalu, key)}"
+            elif section == 'guidelines' and key == 'Total':
+                key = f"Total ({estimate['estimate'] / evalu.sample['population']:.4f} per " \
+                      f"{evalu.sample['unit'].rstrip('s')})"
+            fout.write(f"""
+                            \u200E~{estimate['estimate']:<8} [{interval}]  {key}  (sample: {estimate['sample']})""")
+    fout.write(f"""
+    \n{"-" * 60}\n""")
+    return
+
+
+def report_duplicates(fout, duplicates: dict, limit=20) -> None:
+    """
+    Reports the summary and the largest clusters of the exact and near-duplicate lines
+    :param fout: output stream
+    :param duplicates: results['duplicates'] instance
+    :param limit: number of reported clusters per kind
+    :return:
+    """
+    fout.write("""
+    Duplicate lines
+    """)
+    for key, val in duplicates['summary'].items():
+        fout.write(f"""
+        {key}: {val}""")
+    for kind in ['exact', 'near']:
+        if not duplicates[kind]:
+            continue
+        header = f"{kind.capitalize()} duplicates (largest {min(limit, len(duplicates[kind]))} clusters)"
+        fout.write(f"""\n
+        {header}
+        {"-" * len(header)}""")
+        for cluster in duplicates[kind][:limit]:
+            fout.write(f"""
+            {cluster['count']:-{6}}  {' | '.join(cluster['texts'][:3])}{' | ...' if len(cluster['texts']) > 3 else ''}""")
+            for location in cluster['locations'][:5]:
+                fout.write(f"""
+                        {location['file']}:{location['line']}""")
+            if cluster['count'] > 5:
+                fout.write(f"""
+                        ... ({cluster['count'] - 5} more)""")
+    fout.write(f"""
+    \n{"-" * 60}\n""")
+    return
+
+
+def report_ngrams(fout, result: DefaultDict, evalu) -> None:
+    """
+    Reports the most common character n-grams
+    :param fout: output stream
+    :param result: results['combined'] instance
+    :param evalu: evaluation processhandler
+    :return:
+    """
+    errors = result.get('ngram errors', {})
+    fout.write(f"""
+    N-gram statistics{' (Count-Min sketch estimates, the counts are upper bounds)' if errors else ''}
+    """)
+    for size, ngrams in result['ngrams'].items():
+        fout.write(f"""
+        {size}{f' (overestimated by at most {errors[size]})' if size in errors else ''}
+        {"-" * len(size)}""")
+        for ngram, count in ngrams.items():
+            names = ' | '.join(addinfo(evalu, glyph).strip() for glyph in ngram)
+            fout.write(f"""
+                            \u200E{count:-{6}}  {'{'}{repr(ngram) if controlcharacter_check(ngram) else ngram}{'}'} """
+                       f"""{names}""")
+    fout.write(f"""
+    \n{"-" * 60}\n""")
     return
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+
+
+def codepoint_counts(res_all) -> dict:
+    """
+    Returns the glyph counts by codepoint, the glyph statistics count single codepoints
+    :param res_all: results['combined']['all'] instance
+    :return:
+    """
+    return {ord(glyph): count for glyph, count in res_all['glyph'].items()}
+
+
+class Categorytree(object):
+    """
+    Collects the glyph counts of a category section (e.g. 'cat' with the paths L / LATIN / Ll) and
+    maintains the sums of every category path while the glyphs are added, so the sums need no extra pass
+    """
+    __slots__ = ('glyphs', 'sums')
+
+    def __init__(self):
+        self.glyphs = OrderedDict()
+        self.sums = OrderedDict(sum=0)
+
+    def add_path(self, path) -> OrderedDict:
+        """
+        Adds a category path without glyphs
+        :param path: keys of the category path
+        :return: glyph counts of the category path
+        """
+        node, sums = self.glyphs, self.sums
+        for key in path:
+            node = node.setdefault(key, OrderedDict())
+            sums = sums.setdefault(key, OrderedDict(sum=0))
+        return node
+
+    def add(self, path, glyph: str, count: int) -> None:
+        """
+        Adds the count of a glyph to a category path and to the sums of all its levels
+        :param path: keys of the category path
+        :param glyph: glyph
+        :param count: count
+        :return:
+        """
+        node, sums = self.glyphs, self.sums
+        sums['sum'] += count
+        for key in path:
+            node = node.setdefault(key, OrderedDict())
+            sums = sums.setdefault(key, OrderedDict(sum=0))
+            sums['sum'] += count
+        node[glyph] = node.get(glyph, 0) + count
+
+    def to_results(self, res_section) -> None:
+        """
+        Stores the glyph counts and the sums ('sum' key) in a section of the results instance
+        :param res_section: e.g. results['combined']['cat'] instance
+        :return:
+        """
+        res_section.pop('sum', None)
+        res_section.update(self.glyphs)
+        res_section['sum'] = self.sums
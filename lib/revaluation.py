@@ -1,3 +1,4 @@
+from collections import Counter
 from pathlib import Path
 import unicodedata
 import difflib
@@ -5,36 +6,73 @@ import re
 import imghdr
 
 from lib.editing import update_replacement, string_index_replacement, substitutiontext
-
-try:
-    from tesserocr import PyTessBaseAPI
-except ImportError:
-    print("Revaluation is not available. Please install tesserocr.")
-
+from lib.ocrworker import OCRTimeout
 
 
 def revaluate_ocr(gt: str, filename: Path, reval):
     """
-    Reads the guideline, ocr the image, compares the original groundtruth text and the ocr'd text and substitutes if it
-    is indicated by the rulesprofile.
+    Reads the guideline, ocr the image with every configuration, compares the original groundtruth text and the
+    ocr'd texts and substitutes if it is indicated by the rulesprofile. Only the text of the first configuration
+    substitutes the groundtruth text, the other configurations are compared.
     :param gt: groundtruth text
     :param filename: gt filename
     :param args: arguments instance
     :return:
     """
+    reval.ratio = None
     try:
         imgname = [img for img in filename.parent.rglob(f"{filename.name.split('gt.txt')[0]}*[!.txt]") if imghdr.what(img)][0]
     except StopIteration:
         print(f"No picture found for {filename}")
         reval.write_log(reval.logging, f"No picture found for {filename}")
         return gt
-    with PyTessBaseAPI(psm=reval.psm, lang=reval.lang) as api:
-        api.SetImageFile(str(imgname))
-        ocr = unicodedata.normalize(reval.textnormalization, api.GetUTF8Text()).strip()
+    try:
+        ocrs = reval.ocrworker.ocr(imgname)
+    except OCRTimeout as err:
+        reval.print(err)
+        reval.write_log(reval.logging, f"{err}\n")
+        reval.timeouts.append(filename)
+        return gt
+    revaluated_gt = gt
+    reval.substitutions = Counter()
+    ratio = None
+    for idx, (config, ocr) in enumerate(zip(reval.configs, ocrs)):
+        ocr = unicodedata.normalize(reval.textnormalization, ocr).strip()
+        substitutions = Counter()
+        if idx == 0:
+            revaluated_gt = revaluate_text(gt, ocr, filename, imgname, reval, substitutions)
+            reval.substitutions = substitutions
+            ratio = reval.ratio
+        else:
+            revaluate_text(gt, ocr, filename, imgname, reval, substitutions, primary=False)
+        reval.update_configstats(config, reval.ratio, substitutions)
+    # The other configurations overwrite the ratio, the journal records the one of the primary configuration
+    reval.ratio = ratio
+    return revaluated_gt
+
+
+def revaluate_text(gt: str, ocr: str, filename: Path, imgname: Path, reval, substitutions: Counter, primary=True):
+    """
+    Compares the groundtruth text and the ocr'd text and substitutes if it is indicated by the rulesprofile.
+    :param gt: groundtruth text
+    :param ocr: ocr'd text
+    :param filename: gt filename
+    :param imgname: image filename
+    :param reval: process handler
+    :param substitutions: counter of the substitutions
+    :param primary: only the primary configuration logs and deletes suspicious files
+    :return:
+    """
     gtlist = list(gt)
+    reval.ratio = None
+    aligned = None
     if reval.guidelines and reval.guideline in reval.guidelines.keys():
         for conditionkey, conditions in reval.guidelines[reval.guideline].items():
-            s = difflib.SequenceMatcher(None, gt, ocr)
+            # Align again only if the texts were changed by the previous rules
+            if aligned != (gt, ocr):
+                s = difflib.SequenceMatcher(None, gt, ocr)
+                aligned = (gt, ocr)
+            reval.ratio = s.ratio()
             if s.ratio() > 0.3:
                 subtext = f"{filename.name}: "
                 for groupname, *value in s.get_opcodes():
@@ -50,7 +88,8 @@ def revaluate_ocr(gt: str, filename: Path, reval):
                                             str(ocr[ocridx])):
                                         ocr = update_replacement(reval.guidelines[reval.guideline][conditionkey], gt[gtidx], ocr, ocridx)
                                         gtlist[gtidx] = ocr[ocridx]
-                                        if reval.verbose or reval.log:
+                                        substitutions[gt[gtidx] + "→" + ocr[ocridx]] += 1
+                                        if primary and (reval.verbose or reval.log):
                                             gtsubstring = string_index_replacement(gtsubstring, gtidx-value[0], substitutiontext(gt[gtidx], ocr[ocridx]))
                                         foundidx = ocridx
                                         break
@@ -65,7 +104,8 @@ def revaluate_ocr(gt: str, filename: Path, reval):
                                             ocr = update_replacement(reval.guidelines[reval.guideline][conditionkey], gt[gtidx],
                                                                      ocr, ocridx)
                                             gtlist[gtidx] = ocr[ocridx]
-                                            if reval.verbose or reval.log:
+                                            substitutions[gt[gtidx] + "→" + ocr[ocridx]] += 1
+                                            if primary and (reval.verbose or reval.log):
                                                 gtsubstring = string_index_replacement(gtsubstring, gtidx - value[0],
                                                                                        substitutiontext(gt[gtidx],
                                                                                                         ocr[ocridx]))
@@ -77,26 +117,25 @@ def revaluate_ocr(gt: str, filename: Path, reval):
                                         ocrmatch = re.search(ocrreg,ocr[value[2] + gtmatch.start():])
                                         if ocrmatch and ocrmatch.start() == 0:
                                             ocr = update_replacement(reval.guidelines[reval.guideline][conditionkey], glkey, ocrmatch[0], 0)
-                                            if reval.verbose or reval.log:
+                                            if primary and (reval.verbose or reval.log):
                                                 gtsubstring = string_index_replacement(gtsubstring, gtmatch.start(), substitutiontext(gtsubstring[gtmatch.start():gtmatch.end()], ocrmatch[0]), gtmatch.start()+gtmatch.end())
+                                            substitutions[gtmatch[0] + "→" + ocrmatch[0]] += 1
                                             gtlist[value[0]+gtmatch.start()] = ocrmatch[0]
                                             gtlist[value[0]+gtmatch.start()+1:value[0]+gtmatch.end()] = ""
                                             break
 
                     subtext += gtsubstring
 
-                if gt.strip() != subtext.split(":", 1)[1].strip():
+                if primary and gt.strip() != subtext.split(":", 1)[1].strip():
                     reval.print(subtext)
                     reval.write_log(reval.logging, subtext + '\n')
             gt = "".join(gtlist)
-    if s.ratio() < reval.diffratio:
+    if primary and s.ratio() < reval.diffratio:
         if reval.delete_suspicous and len(gt) > 5:
             if s.ratio() < reval.diffratio:
                 reval.filecounter+=1
-                print(f"{reval.filencounter}/{reval.num_filenames} - {s.ratio()}%")
-                import os
-                os.remove(str(filename))
-                os.remove(str(filename).replace(".gt.txt",".png"))
+                print(f"{reval.filecounter}/{reval.num_filenames()} - {s.ratio()}%")
+                reval.writeback.delete(filename, imgname)
         else:
             if s.ratio() < reval.diffratio:
                 reval.write_log(reval.difflogging, f"Ratio:{s.ratio():.3f} Filename:{filename.name}\n"
@@ -0,0 +1,209 @@
+import math
+import random
+from collections import defaultdict, Counter, OrderedDict
+from typing import DefaultDict
+
+from lib.evaluation import glyphinfo
+from lib.graphemes import grapheme_clusters
+from lib.io import read_input_textlines, normalize_textlines
+from lib.settings import compiled_regex
+
+# z-value of the 95% confidence intervals
+CONFIDENCE_Z = 1.96
+SAMPLE_SECTIONS = ['glyph', 'combined glyph', 'categories', 'guidelines']
+
+
+def reservoir_sample(stream, size: int, seed=0) -> tuple:
+    """
+    Draws a reproducible uniform random sample from a stream of unknown length (reservoir sampling)
+    :param stream: iterable of items
+    :param size: sample size
+    :param seed: seed of the random generator
+    :return: sample (in stream order) and the number of items in the stream
+    """
+    rng = random.Random(seed)
+    reservoir = []
+    population = 0
+    for population, item in enumerate(stream, start=1):
+        if len(reservoir) < size:
+            reservoir.append((population, item))
+        else:
+            idx = rng.randrange(population)
+            if idx < size:
+                reservoir[idx] = (population, item)
+    return [item for _, item in sorted(reservoir, key=lambda posval: posval[0])], population
+
+
+class Sampleestimator(object):
+    """
+    Collects the counts of every sample unit (file or line) and estimates the population totals
+    with confidence intervals (expansion estimator with finite population correction)
+    """
+
+    def __init__(self, population: int):
+        self.population = population
+        self.units = 0
+        self.sums = defaultdict(Counter)
+        self.squaresums = defaultdict(Counter)
+
+    def add(self, section: str, counts: dict) -> None:
+        """
+        Adds the counts of the current sample unit
+        :param section: name of the section, e.g. 'glyph'
+        :param counts: counts of the unit
+        :return:
+        """
+        for key, count in counts.items():
+            self.sums[section][key] += count
+            self.squaresums[section][key] += count * count
+
+    def estimate(self, section: str, key) -> tuple:
+        """
+        Estimates the population total of a key
+        :param section: name of the section
+        :param key: key
+        :return: estimated total and the half width of the confidence interval (None if it can't be estimated)
+        """
+        units, total = self.units, self.sums[section][key]
+        if not units:
+            return 0, None
+        scale = self.population / units
+        if units >= self.population:
+            return total, 0.0
+        if units < 2:
+            return total * scale, None
+        mean = total / units
+        variance = max(self.squaresums[section][key] - units * mean * mean, 0) / (units - 1)
+        stderr = self.population * math.sqrt(variance / units * (1 - units / self.population))
+        return total * scale, CONFIDENCE_Z * stderr
+
+    def estimates(self, section: str) -> dict:
+        """
+        Estimates all keys of a section
+        :param section: name of the section
+        :return: dict with the key as key and the estimate, the confidence interval and the sample count as value
+        """
+        estimates = OrderedDict()
+        for key, total in self.sums[section].most_common():
+            estimate, halfwidth = self.estimate(section, key)
+            estimates[key] = {'estimate': round(estimate), 'sample': total,
+                              'ci': None if halfwidth is None else [max(total, round(estimate - halfwidth)),
+                                                                    round(estimate + halfwidth)]}
+        return estimates
+
+
+def category_paths(glyphs: Counter) -> Counter:
+    """
+    Sums the glyph counts per category path (e.g. 'L', 'L / LATIN', 'L / LATIN / Ll'), like the category sums
+    :param glyphs: glyph counts
+    :return:
+    """
+    paths = Counter()
+    for glyph, count in glyphs.items():
+        uname, ucat, usubcat = glyphinfo(glyph)
+        paths['Total'] += count
+        paths[ucat[0]] += count
+        paths[f"{ucat[0]} / {usubcat}"] += count
+        paths[f"{ucat[0]} / {usubcat} / {ucat}"] += count
+    return paths
+
+
+def sample_units(evalu, size: int, unit='files', seed=0) -> tuple:
+    """
+    Draws the sample units from the discovery stream of the files. File samples read only the sampled files,
+    line samples stream through all files but keep only the sampled lines.
+    :param evalu: process handler
+    :param size: sample size
+    :param unit: 'files' or 'lines'
+    :param seed: seed of the random generator
+    :return: list of (path index, textlines) and the population size
+    """
+    def fnames():
+        for pidx, (fpath, fnames) in enumerate(evalu.files.items()):
+            for fname in fnames:
+                yield pidx, fname
+
+    def read(fname):
+        try:
+            return read_input_textlines(fname)[1]
+        except ValueError:
+            evalu.print(f"{fname.name} (ignored)")
+            return None
+
+    if unit == 'files':
+        sample, population = reservoir_sample(fnames(), size, seed)
+        units = [(pidx, textlines) for pidx, textlines in ((pidx, read(fname)) for pidx, fname in sample)
+                 if textlines is not None]
+        return units, population - (len(sample) - len(units))
+
+    def lines():
+        for pidx, fname in fnames():
+            for textline in read(fname) or []:
+                yield pidx, textline
+
+    sample, population = reservoir_sample(lines(), size, seed)
+    return [(pidx, [textline]) for pidx, textline in sample], population
+
+
+def evaluate_sample(evalu, size: int, unit='files', seed=0, missing_unicodes=(), ucd=None) -> DefaultDict:
+    """
+    Evaluates a random sample of the files or lines. The statistics are scaled to estimates of the whole dataset,
+    the confidence intervals are stored in results['estimates'].
+    :param evalu: process handler
+    :param size: sample size
+    :param unit: 'files' or 'lines'
+    :param seed: seed of the random generator
+    :param missing_unicodes: missing unicode profiles
+    :param ucd: unicode handler
+    :return:
+    """
+    from lib.analysis import analyse
+
+    units, population = sample_units(evalu, size, unit, seed)
+    estimator = Sampleestimator(population)
+    guideline = evalu.guidelines.get(evalu.guideline, {}) if evalu.guideline and evalu.guidelines else {}
+    patterns = [(conditionkey, condition, compiled_regex(condition)) for conditionkey, conditions in guideline.items()
+                if 'regex' in conditionkey.lower() for condition in conditions]
+    violation_codepoints = set(condition for conditionkey, conditions in guideline.items()
+                               if 'regex' not in conditionkey.lower()
+                               for condition in conditions if isinstance(condition, int))
+    violation_clusters = set(condition for conditionkey, conditions in guideline.items()
+                             if conditionkey.lower().startswith('combined') for condition in conditions)
+    for pidx, textlines in units:
+        textlines = normalize_textlines(textlines, evalu.textnormalization)
+        glyphs = Counter()
+        combined_glyphs = Counter()
+        for textline in textlines:
+            glyphs.update(textline)
+            combined_glyphs.update(grapheme_clusters(textline))
+        estimator.units += 1
+        estimator.add('glyph', glyphs)
+        estimator.add('combined glyph', combined_glyphs)
+        estimator.add('categories', category_paths(glyphs))
+        if guideline:
+            violations = Counter()
+            for conditionkey, condition, pattern in patterns:
+                for textline in textlines:
+                    violations[f"{conditionkey} / {condition}"] += len(pattern.findall(textline))
+            violations['Total'] = sum(violations.values()) + sum(count for glyph, count in glyphs.items()
+                                                                 if ord(glyph) in violation_codepoints) + \
+                sum(count for cluster, count in combined_glyphs.items() if cluster in violation_clusters)
+            estimator.add('guidelines', +violations)
+
+    results = defaultdict(OrderedDict)
+    for pidx, fpath in enumerate(evalu.files.keys()):
+        results['path_indexes'][f"{pidx}"] = fpath.absolute()
+    res_all = results['combined']['all'] = OrderedDict()
+    res_all['glyph'] = Counter({glyph: val['estimate'] for glyph, val in estimator.estimates('glyph').items()})
+    res_all['combined glyph'] = Counter({glyph: val['estimate'] for glyph, val in
+                                         estimator.estimates('combined glyph').items()})
+    regex_violations = defaultdict(lambda: defaultdict(int))
+    for key, val in estimator.estimates('guidelines').items():
+        if key != 'Total':
+            conditionkey, condition = key.split(' / ', 1)
+            regex_violations[conditionkey][condition] = val['estimate']
+    results['regex violations'] = {evalu.guideline: regex_violations} if guideline else {}
+    analyse(results, evalu, missing_unicodes, ucd)
+    results['sample'] = {'unit': unit, 'size': estimator.units, 'population': population, 'seed': seed}
+    results['estimates'] = {section: estimator.estimates(section) for section in SAMPLE_SECTIONS}
+    return results
@@ -0,0 +1,180 @@
+import json
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lib.api import Evaluator
+from lib.io import app_path
+from lib.settings import load_profiles, ProfileError
+from lib.unicodetools import load_ucd
+
+PROFILES = ["profiles/evaluate/guidelines", "profiles/evaluate/categories", "profiles/evaluate/missing_unicode"]
+
+
+def request_textlines(request: dict) -> list:
+    """
+    Returns the textlines of a request and rejects lines, which are not textlines or [line id, textline] pairs
+    or which contain linebreaks
+    :param request: dict with 'lines' or 'text'
+    :return:
+    """
+    if 'lines' not in request:
+        text = request.get('text', '')
+        if not isinstance(text, str):
+            raise ValueError("'text' must be a string")
+        return text.strip().split('\n')
+    textlines = request['lines']
+    if not isinstance(textlines, list) or not all(
+            isinstance(textline, str) or (isinstance(textline, list) and len(textline) == 2 and
+                                          all(isinstance(val, str) for val in textline))
+            for textline in textlines):
+        raise ValueError("'lines' must be a list of textlines or [line id, textline] pairs")
+    if any('\n' in (textline if isinstance(textline, str) else textline[1]) for textline in textlines):
+        raise ValueError("The textlines of 'lines' must not contain linebreaks")
+    return textlines
+
+
+class Evaluationservice(object):
+    """
+    Keeps the profiles and the unicode database warm and evaluates requests
+    """
+
+    def __init__(self, guideline=None, textnormalization='NFC', ucd=True, verbose=False):
+        self.guideline = guideline
+        self.textnormalization = textnormalization
+        self.verbose = verbose
+        self.ucd = load_ucd() if ucd else None
+        self.evaluator = None
+        self._lock = threading.Lock()
+        self._mtimes = {}
+        self.reload()
+
+    def _profile_mtimes(self):
+        return {profile: os.stat(app_path().joinpath(profile)).st_mtime_ns for profile in PROFILES}
+
+    def reload(self) -> None:
+        """
+        Reloads all evaluation profiles and swaps in a new evaluator, running requests keep their evaluator.
+        The profiles are compiled before the cache is cleared, so a malformed profile raises a ProfileError
+        and the previous profiles stay in use.
+        :return:
+        """
+        with self._lock:
+            self._mtimes = self._profile_mtimes()
+            for profile in PROFILES:
+                load_profiles.__wrapped__(profile)
+            load_profiles.cache_clear()
+            for profile in PROFILES:
+                load_profiles(profile)
+            self.evaluator = Evaluator(self.guideline, textnormalization=self.textnormalization, ucd=self.ucd,
+                                       verbose=self.verbose)
+
+    def check_reload(self) -> bool:
+        """
+        Reloads the profiles if one of the profile files was modified, a malformed profile gets reported once
+        and the previous profiles are kept until the next modification
+        :return:
+        """
+        if self._profile_mtimes() != self._mtimes:
+            try:
+                self.reload()
+            except ProfileError as err:
+                print(f"The profiles were not reloaded, the previous profiles are kept: {err}")
+                return False
+            return True
+        return False
+
+    def evaluate(self, request: dict) -> dict:
+        """
+        Evaluates the lines or the text of a request
+        :param request: dict with 'lines' (textlines or [line id, textline] pairs) or 'text' and the options
+        'guideline', 'custom_categories', 'missing_unicodes' and 'textnormalization'
+        :return:
+        """
+        if not isinstance(request, dict):
+            raise ValueError("The request must be a json object")
+        textlines = request_textlines(request)
+        self.check_reload()
+        with self._lock:
+            evaluator = self.evaluator
+        return evaluator.evaluate(textlines, 'request', request.get('guideline'), request.get('custom_categories'),
+                                  request.get('missing_unicodes', []), request.get('textnormalization')).to_dict()
+
+
+class Evaluationrequesthandler(BaseHTTPRequestHandler):
+    """
+    POST /evaluate evaluates a json request, POST /reload reloads the profiles, GET /health checks the service
+    """
+    service = None
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.service.verbose:
+            super().log_message(format, *args)
+
+    def _respond(self, status: int, content: dict) -> None:
+        body = json.dumps(content, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._respond(200, {'status': 'ok', 'guideline': self.service.guideline})
+        else:
+            self._respond(404, {'error': f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        try:
+            if self.path == '/reload':
+                self.service.reload()
+                self._respond(200, {'status': 'reloaded'})
+            elif self.path == '/evaluate':
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                self._respond(200, self.service.evaluate(request))
+            else:
+                self._respond(404, {'error': f"Unknown endpoint {self.path}"})
+        except (ValueError, KeyError, TypeError) as err:
+            self._respond(400, {'error': str(err)})
+        except Exception as err:
+            # Unexpected errors get a response too, the service keeps running
+            self.log_error("%s", repr(err))
+            self._respond(500, {'error': f"{type(err).__name__}: {err}"})
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service: Evaluationservice, host='127.0.0.1', port=8080, socket=None) -> None:
+    """
+    Serves evaluation requests until it gets interrupted
+    :param service: evaluation service
+    :param host: host of the http endpoint
+    :param port: port of the http endpoint
+    :param socket: path of a unix socket, which is used instead of host and port
+    :return:
+    """
+    handler = type('Handler', (Evaluationrequesthandler,), {'service': service})
+    if socket:
+        if os.path.exists(socket):
+            os.remove(socket)
+        server = ThreadingUnixHTTPServer(socket, handler)
+        print(f"Serving evaluation requests on unix socket {socket}")
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        print(f"Serving evaluation requests on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket and os.path.exists(socket):
+            os.remove(socket)
@@ -1,58 +1,146 @@
+import hashlib
+import pickle
+import re
 from collections import defaultdict
 from functools import lru_cache
-from pathlib import Path
 
 from lib.functools import get_defaultdict
+from lib.io import app_path
+
+
+# Increase if the compiled form of the profiles changes
+PROFILE_CACHE_VERSION = 2
+# Subsettings which are resolved to codepoint sets
+CODEPOINT_SUBSETTINGS = ('glyph', 'hex', 'codepoint')
+
+
+class ProfileError(ValueError):
+    """
+    Malformed rule in a profile file
+    """
+
+    def __init__(self, fname, lineno, msg):
+        super().__init__(f"{fname}:{lineno}: {msg}")
 
 
 @lru_cache()
 def load_profiles(fname: str):
     """
-    Loads the profiles into a dict
+    Loads the compiled profiles into a dict, the compiled profiles are cached on disk by the hash of the profile file
     :param fname: name of the profile file
     :return:
     """
+    content = app_path().joinpath(fname).read_bytes()
+    checksum = hashlib.sha1(content + f"{PROFILE_CACHE_VERSION}".encode('utf-8')).hexdigest()
+    cachefile = app_path().joinpath('profiles', '.cache', f"{'_'.join(fname.split('/')[1:3])}_{checksum}.pickle")
+    if cachefile.exists():
+        try:
+            with open(cachefile, 'rb') as fin:
+                return pickle.load(fin)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+    settings = compile_profiles(fname, content.decode('utf-8'))
+    try:
+        cachefile.parent.mkdir(parents=True, exist_ok=True)
+        for outdated in cachefile.parent.glob(f"{'_'.join(fname.split('/')[1:3])}_*.pickle"):
+            outdated.unlink()
+        with open(cachefile, 'wb') as fout:
+            pickle.dump(settings, fout)
+    except OSError:
+        pass
+    return settings
+
+
+def compile_profiles(fname: str, content: str):
+    """
+    Parses and validates the profiles, codepoint rules are resolved to sets and regex rules are compiled
+    :param fname: name of the profile file
+    :param content: content of the profile file
+    :return:
+    """
     settings = defaultdict(dict)
     setting, subsetting = None, None
     mode, submode = fname.split('/')[1:3]
-    with open(Path(fname), 'r') as fin:
-        for line in fin.readlines():
-            line = line.strip()
-            if len(line) < 1 or line[0] == '#':
-                continue
-            if line[0] + line[-1] == '[]':
-                setting = line.strip('[]')
-                if mode == 'revaluate':
-                    get_defaultdict(settings, setting, instance=dict)
-                else:
-                    get_defaultdict(settings, setting, instance=list)
-                continue
-            if '==' in line:
-                subsetting, line = [part.strip() for part in line.split("==")]
-                line = line.strip()
-            if setting and mode == 'revaluate':
-                get_defaultdict(settings[setting], subsetting, instance=list)  # TODO: Check if it still works
-                if subsetting and isinstance(settings[setting][subsetting], dict):
-                    lines = [line]
-                    if '<-->' in line:
-                        parts = line.split('<-->')
-                        lines = [parts[0] + '-->' + parts[1], parts[1] + '-->' + parts[0]]
-                    for line in lines:
-                        orig, values = [part.strip() for part in line.split('-->')]
-                        for value in values.split('||'):
-                            if '<--' in value:
-                                sub, rep = value.split('<--')[:2]
-                                settings[setting][subsetting]["<--"] = {orig: rep.strip()}
-                            value = value.strip()
-                            settings[setting][subsetting][orig].append(read_subsettings(subsetting, value))
-            elif setting:
-                if subsetting and isinstance(settings[setting][subsetting], list):
-                    for value in line.split('||'):
-                        value = value.strip()
-                        settings[setting][subsetting].extend(read_subsettings(subsetting, value))
-
-        if setting and subsetting:
-            return settings
+    for lineno, line in enumerate(content.split('\n'), start=1):
+        line = line.strip()
+        if len(line) < 1 or line[0] == '#':
+            continue
+        if line[0] + line[-1] == '[]':
+            setting, subsetting = line.strip('[]'), None
+            if mode == 'revaluate':
+                get_defaultdict(settings, setting, instance=dict)
+            else:
+                get_defaultdict(settings, setting, instance=list)
+            continue
+        if not setting:
+            raise ProfileError(fname, lineno, "rule outside of a [profile] section")
+        if '==' in line:
+            subsetting, line = [part.strip() for part in line.split("==", 1)]
+        if not subsetting:
+            raise ProfileError(fname, lineno, "rule without type, e.g. 'Glyph == a||b'")
+        if mode == 'revaluate':
+            get_defaultdict(settings[setting], subsetting, instance=list)
+            lines = [line]
+            if '<-->' in line:
+                parts = line.split('<-->')
+                lines = [parts[0] + '-->' + parts[1], parts[1] + '-->' + parts[0]]
+            for line in lines:
+                if '-->' not in line:
+                    raise ProfileError(fname, lineno, "substitution rule without '-->' or '<-->'")
+                orig, values = [part.strip() for part in line.split('-->', 1)]
+                for value in values.split('||'):
+                    if '<--' in value:
+                        value, rep = value.split('<--')[:2]
+                        settings[setting][subsetting]["<--"] = {orig: rep.strip()}
+                    value = value.strip()
+                    settings[setting][subsetting][orig].extend(
+                        compile_subsettings(fname, lineno, subsetting, value))
+        else:
+            for value in line.split('||'):
+                value = value.strip()
+                settings[setting][subsetting].extend(compile_subsettings(fname, lineno, subsetting, value))
+    # Resolve the codepoint rules to sets for fast lookups
+    for setting, subsettings in settings.items():
+        for subsetting, subvals in subsettings.items():
+            if isinstance(subvals, list) and subsetting.lower().startswith(CODEPOINT_SUBSETTINGS):
+                subsettings[subsetting] = frozenset(subvals)
+    if setting and subsetting:
+        return settings
+
+
+def compile_subsettings(fname: str, lineno: int, subsetting: str, value: str) -> list:
+    """
+    Reads a single rule value and validates it
+    :param fname: name of the profile file
+    :param lineno: line number of the rule
+    :param subsetting: type of the rule
+    :param value: value of the rule
+    :return:
+    """
+    if not value:
+        raise ProfileError(fname, lineno, f"empty value in '{subsetting}' rule")
+    try:
+        values = read_subsettings(subsetting, value)
+    except (ValueError, TypeError) as err:
+        raise ProfileError(fname, lineno, f"invalid value '{value}' in '{subsetting}' rule ({err})")
+    if values is None:
+        raise ProfileError(fname, lineno, f"invalid value '{value}' in '{subsetting}' rule")
+    if 'regex' in subsetting.lower():
+        try:
+            compiled_regex(value)
+        except re.error as err:
+            raise ProfileError(fname, lineno, f"invalid regex '{value}' ({err})")
+    return values
+
+
+@lru_cache(maxsize=None)
+def compiled_regex(pattern: str):
+    """
+    Returns the compiled regex of a rule
+    :param pattern: regex pattern
+    :return:
+    """
+    return re.compile(rf"{pattern}")
 
 
 def read_subsettings(subsetting, value):
@@ -69,7 +157,8 @@ def read_subsettings(subsetting, value):
             else:
                 return [value]
     if subsetting.lower().startswith('combined'):
-        if len(value) == 2:
+        # Grapheme clusters of a base glyph and one or more marks
+        if len(value) >= 2:
             return [value]
     if subsetting.lower().startswith('glyph'):
         if '-' in value and len(value) > 1 and len(value.split('-')) == 2:
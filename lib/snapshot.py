@@ -0,0 +1,109 @@
+import gzip
+import json
+from collections import defaultdict, OrderedDict, Counter
+from pathlib import Path
+from typing import DefaultDict
+
+from lib.functools import get_defaultdict
+from lib.results import codepoint_counts
+
+SNAPSHOT_FORMAT = "gtreval-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+def _open_snapshot(fname: Path, mode: str):
+    if fname.suffix == '.gz':
+        return gzip.open(fname, mode + 't', encoding='utf-8')
+    return fname.open(mode, encoding='utf-8')
+
+
+def create_snapshot(results: DefaultDict, evalu, regex_violations: dict) -> dict:
+    """
+    Creates the mergeable statistics snapshot of an evaluation
+    :param results: results instance with the combined glyph statistics
+    :param evalu: process handler
+    :param regex_violations: regex violation counts per guideline
+    :return:
+    """
+    res_all = results['combined']['all']
+    return {'format': SNAPSHOT_FORMAT,
+            'version': SNAPSHOT_VERSION,
+            'textnormalization': evalu.textnormalization,
+            'lines': len(results['single']),
+            'path_indexes': {pidx: str(fpath) for pidx, fpath in results['path_indexes'].items()},
+            'glyph': dict(res_all['glyph']),
+            'combined glyph': dict(res_all['combined glyph']),
+            'codepoints': {str(codepoint): count for codepoint, count in codepoint_counts(res_all).items()},
+            'regex violations': regex_violations}
+
+
+def write_snapshot(snapshot: dict, fname) -> None:
+    """
+    Writes the snapshot as compact json, if the filename ends with '.gz' it gets compressed
+    :param snapshot: snapshot instance
+    :param fname: output filename
+    :return:
+    """
+    fname = Path(fname)
+    if not fname.parent.exists():
+        fname.parent.mkdir(parents=True)
+    with _open_snapshot(fname, 'w') as fout:
+        json.dump(snapshot, fout, ensure_ascii=False, separators=(',', ':'))
+    return
+
+
+def load_snapshot(fname) -> dict:
+    """
+    Loads and validates a snapshot
+    :param fname: snapshot filename
+    :return:
+    """
+    try:
+        with _open_snapshot(Path(fname), 'r') as fin:
+            snapshot = json.load(fin)
+    except (UnicodeDecodeError, OSError, json.JSONDecodeError):
+        snapshot = {}
+    if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"{fname} is not a gtreval snapshot")
+    if snapshot.get('version', 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"{fname} has the snapshot version {snapshot['version']}, "
+                         f"but only versions up to {SNAPSHOT_VERSION} are supported")
+    return snapshot
+
+
+def merge_snapshots(snapshots, evalu) -> DefaultDict:
+    """
+    Merges multiple snapshots into a results instance, the path indexes are renumbered.
+    All snapshots must have the text normalization of the process handler, otherwise a ValueError is raised.
+    :param snapshots: iterable of snapshot instances
+    :param evalu: process handler
+    :return:
+    """
+    results = defaultdict(OrderedDict)
+    get_defaultdict(results, 'path_indexes')
+    get_defaultdict(results, 'combined')
+    glyphs, combined_glyphs = Counter(), Counter()
+    regex_violations = defaultdict(lambda: defaultdict(Counter))
+    lines = 0
+    for snapshot in snapshots:
+        if snapshot['textnormalization'] != evalu.textnormalization:
+            # The codepoint counts of different text normalizations can't be added up
+            raise ValueError(f"A snapshot was normalized with {snapshot['textnormalization']} instead of "
+                             f"{evalu.textnormalization}, all snapshots need the text normalization "
+                             f"of --textnormalization")
+        for pidx in sorted(snapshot['path_indexes'].keys(), key=int):
+            results['path_indexes'][f"{len(results['path_indexes'])}"] = Path(snapshot['path_indexes'][pidx])
+        glyphs.update(snapshot['glyph'])
+        combined_glyphs.update(snapshot['combined glyph'])
+        for guideline, conditions in snapshot['regex violations'].items():
+            for conditionkey, counts in conditions.items():
+                regex_violations[guideline][conditionkey].update(counts)
+        lines += snapshot['lines']
+    res_all = results['combined']['all']
+    res_all['glyph'] = glyphs
+    res_all['combined glyph'] = combined_glyphs
+    results['regex violations'] = {guideline: {conditionkey: dict(counts) for conditionkey, counts in
+                                               conditions.items()} for guideline, conditions in
+                                   regex_violations.items()}
+    results['lines'] = lines
+    return results
@@ -23,12 +23,10 @@ SOFTWARE.
 '''
 
 import codecs
-import ftplib
 import os
 import re
 import struct
 import sys
-import zipfile
 from collections import defaultdict, namedtuple
 from fractions import Fraction
 
@@ -400,6 +398,8 @@ class UnicodeData:
 
 
 def update_ucd(version=None):
+    import ftplib
+    import zipfile
     ftp_server = 'ftp.unicode.org'
     remote_path = '/Public/UCD/latest/ucd/'
     with ftplib.FTP(ftp_server) as ftp:
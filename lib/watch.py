@@ -0,0 +1,319 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from collections import defaultdict, OrderedDict, Counter
+from pathlib import Path
+from typing import DefaultDict
+
+from lib.analysis import analyse
+from lib.counting import Glyphcounter
+from lib.evaluation import count_regex_violations
+from lib.functools import get_defaultdict
+from lib.io import create_json, set_output, read_textlines
+from lib.report import create_report
+
+# inotify events of the watched directories
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def scan_textfiles(fpaths, excluded=()) -> dict:
+    """
+    Collects all text files of the input paths with their modification time and size
+    :param fpaths: input paths
+    :param excluded: absolute paths of files which are not collected, e.g. the report
+    :return:
+    """
+    textfiles = {}
+    stack = []
+    for fpath in fpaths:
+        fpath = Path(fpath)
+        if fpath.is_file():
+            try:
+                stat = fpath.stat()
+            except OSError:
+                continue
+            textfiles[fpath] = (stat.st_mtime_ns, stat.st_size)
+        else:
+            stack.append(str(fpath))
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.txt') and entry.is_file() and \
+                            os.path.abspath(entry.path) not in excluded:
+                        stat = entry.stat()
+                        textfiles[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    # The file was deleted during the scan
+                    continue
+    return textfiles
+
+
+def output_files(output) -> set:
+    """
+    Returns the absolute paths of the report and the json output, which are never read as input
+    :param output: output path of the report
+    :return:
+    """
+    if not output:
+        return set()
+    output = Path(output)
+    if output.is_dir() or not output.suffix:
+        output = output.joinpath("result.txt")
+    return {os.path.abspath(output), os.path.abspath(output.with_suffix('.json'))}
+
+
+class Inotifywatcher(object):
+    """
+    Reports the changed paths of the watched directory trees with the Linux inotify API,
+    so no rescan of the input paths is needed between the changes
+    """
+
+    def __init__(self, fpaths):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify is not available")
+        self.directories = {}
+        for fpath in fpaths:
+            fpath = Path(fpath)
+            self.add_tree(fpath.parent if fpath.is_file() else fpath)
+
+    @classmethod
+    def create(cls, fpaths):
+        """
+        Returns an inotify watcher or None if inotify is not available, e.g. on other systems than Linux
+        :param fpaths: input paths
+        :return:
+        """
+        try:
+            return cls(fpaths)
+        except (OSError, AttributeError, TypeError):
+            return None
+
+    def add_tree(self, fpath: Path) -> None:
+        """
+        Watches a directory and all its subdirectories
+        :param fpath: directory
+        :return:
+        """
+        for dirpath, _, _ in os.walk(fpath):
+            wd = self._add_watch(self.fd, os.fsencode(dirpath), INOTIFY_MASK)
+            if wd >= 0:
+                self.directories[wd] = Path(dirpath)
+
+    def changes(self, timeout: float):
+        """
+        Waits for changes and returns the changed paths
+        :param timeout: maximal waiting time in seconds
+        :return: set of changed paths and set of added or removed directories, None if the events overflowed
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set(), set()
+        paths, directories = set(), set()
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, namelen = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + namelen].rstrip(b'\0')
+                offset += INOTIFY_EVENT.size + namelen
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if mask & IN_IGNORED:
+                    self.directories.pop(wd, None)
+                    continue
+                if wd not in self.directories or not name:
+                    continue
+                path = self.directories[wd].joinpath(os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.add_tree(path)
+                    directories.add(path)
+                elif not mask & IN_CREATE:
+                    # Created files are reported with their IN_CLOSE_WRITE event
+                    paths.add(path)
+        return paths, directories
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Evaluationwatcher(object):
+    """
+    Keeps the statistics of every text file and updates the combined statistics incrementally
+    """
+
+    def __init__(self, fpaths, evalu, missing_unicodes=(), ucd=None):
+        self.fpaths = fpaths
+        self.evalu = evalu
+        self.missing_unicodes = missing_unicodes
+        self.ucd = ucd
+        self.guidelines = {evalu.guideline: evalu.guidelines[evalu.guideline]} \
+            if evalu.guidelines and evalu.guideline in evalu.guidelines else {}
+        self.excluded = output_files(evalu.output)
+        self.inputfiles = set(Path(fpath) for fpath in fpaths if Path(fpath).is_file())
+        self.inputdirectories = set(Path(fpath) for fpath in fpaths) - self.inputfiles
+        self.textfiles = {}
+        self.filestatistics = {}
+        self.glyph = Counter()
+        self.combined_glyph = Counter()
+        self.regex_violations = Counter()
+
+    def _file_statistics(self, fname: Path) -> tuple:
+        glyphcounter = Glyphcounter()
+        try:
+            textlines = read_textlines(fname, self.evalu.textnormalization)
+        except (UnicodeDecodeError, OSError):
+            self.evalu.print(f"{fname.name} (ignored)")
+            return Counter(), Counter(), Counter()
+        glyphcounter.update(textlines)
+        glyphcounter.flush()
+        regex_violations = Counter({(guideline, conditionkey, condition): count
+                                    for guideline, conditions in
+                                    count_regex_violations(textlines, self.guidelines).items()
+                                    for conditionkey, counts in conditions.items()
+                                    for condition, count in counts.items()})
+        return glyphcounter.glyph, glyphcounter.combined_glyph, regex_violations
+
+    def _remove(self, fname: Path) -> None:
+        glyph, combined_glyph, regex_violations = self.filestatistics.pop(fname)
+        self.glyph -= glyph
+        self.combined_glyph -= combined_glyph
+        self.regex_violations -= regex_violations
+
+    def _add(self, fname: Path) -> None:
+        self.filestatistics[fname] = self._file_statistics(fname)
+        glyph, combined_glyph, regex_violations = self.filestatistics[fname]
+        self.glyph.update(glyph)
+        self.combined_glyph.update(combined_glyph)
+        self.regex_violations.update(regex_violations)
+
+    def update(self, changes=None) -> tuple:
+        """
+        Updates the statistics of added, changed and deleted files, the input paths are rescanned
+        if no changes are given
+        :param changes: changed paths and added or removed directories of the inotify watcher
+        :return: number of added, changed and deleted files
+        """
+        if changes is None:
+            textfiles = scan_textfiles(self.fpaths, self.excluded)
+        else:
+            paths, directories = changes
+            textfiles = dict(self.textfiles)
+            for directory in directories:
+                for fname in [fname for fname in textfiles if directory in fname.parents]:
+                    del textfiles[fname]
+                if self._is_input(directory):
+                    textfiles.update(scan_textfiles([directory], self.excluded))
+            for path in paths:
+                textfiles.pop(path, None)
+                if path.suffix == '.txt' and os.path.abspath(path) not in self.excluded and self._is_input(path):
+                    textfiles.update(scan_textfiles([path]))
+        added = [fname for fname in textfiles if fname not in self.textfiles]
+        changed = [fname for fname, stat in textfiles.items() if fname in self.textfiles and
+                   self.textfiles[fname] != stat]
+        deleted = [fname for fname in self.textfiles if fname not in textfiles]
+        for fname in changed + deleted:
+            self._remove(fname)
+        for fname in added + changed:
+            self._add(fname)
+        self.textfiles = textfiles
+        return len(added), len(changed), len(deleted)
+
+    def _is_input(self, path: Path) -> bool:
+        # The parent directories of input files are watched too, but only the input files are evaluated
+        return path in self.inputfiles or any(directory in path.parents for directory in self.inputdirectories)
+
+    def results(self) -> DefaultDict:
+        """
+        Creates a results instance from the current combined statistics
+        :return:
+        """
+        results = defaultdict(OrderedDict)
+        get_defaultdict(results, 'path_indexes')
+        for fpath in sorted(set(fname.parent for fname in self.textfiles)):
+            results['path_indexes'][f"{len(results['path_indexes'])}"] = fpath.absolute()
+        get_defaultdict(results, 'combined')
+        res_all = results['combined']['all']
+        res_all['glyph'] = +self.glyph
+        res_all['combined glyph'] = +self.combined_glyph
+        regex_violations = defaultdict(lambda: defaultdict(dict))
+        for (guideline, conditionkey, condition), count in self.regex_violations.items():
+            if count > 0:
+                regex_violations[guideline][conditionkey][condition] = count
+        results['regex violations'] = regex_violations
+        return results
+
+    def render(self) -> None:
+        """
+        Analyses the current statistics and recreates the report
+        :return:
+        """
+        results = self.results()
+        self.evalu.files = {fpath: [] for fpath in results['path_indexes'].values()}
+        analyse(results, self.evalu, self.missing_unicodes, self.ucd)
+        set_output(self.evalu)
+        create_report(results, self.evalu)
+        if self.evalu.json:
+            create_json(results, self.evalu.output)
+
+
+def watch_evaluation(fpaths, evalu, missing_unicodes=(), interval=0.5) -> None:
+    """
+    Watches the input paths and recreates the report whenever text files are added, changed or deleted
+    :param fpaths: input paths
+    :param evalu: process handler
+    :param missing_unicodes: missing unicode profiles
+    :param interval: polling interval in seconds
+    :return:
+    """
+    ucd = None
+    if missing_unicodes:
+        from lib.unicodetools import load_ucd
+        ucd = load_ucd(update=True)
+    watcher = Evaluationwatcher(fpaths, evalu, missing_unicodes, ucd)
+    # inotify reports the changes directly, otherwise the input paths are rescanned every interval
+    inotify = Inotifywatcher.create(fpaths)
+    changes = None
+    try:
+        while True:
+            start = time.perf_counter()
+            added, changed, deleted = watcher.update(changes)
+            if added or changed or deleted:
+                watcher.render()
+                evalu.print(f"{added} added, {changed} changed, {deleted} deleted files "
+                            f"({time.perf_counter() - start:.3f}s)")
+            if inotify:
+                changes = inotify.changes(interval)
+            else:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if inotify:
+            inotify.close()
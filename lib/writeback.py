@@ -0,0 +1,144 @@
+import difflib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# Number of staged changes which are applied together
+WRITEBACK_BATCHSIZE = 500
+
+
+def unified_diff(original: str, text: str, fromfile: str, tofile: str):
+    """
+    Yields the lines of an unified diff, which also marks missing newlines at the end of the files
+    :param original: original text
+    :param text: changed text
+    :param fromfile: name of the original file
+    :param tofile: name of the changed file
+    :return:
+    """
+    for line in difflib.unified_diff(original.splitlines(keepends=True), text.splitlines(keepends=True),
+                                     fromfile, tofile):
+        yield line if line.endswith('\n') else line + "\n\\ No newline at end of file\n"
+
+
+class Writeback(object):
+    """
+    Collects the changes of the ground truth files and applies them batchwise.
+    Every file is written to a temporary file and renamed, so a crash never leaves a half-written file.
+    Alternatively all changes are written as unified diff to a single patch file and the tree stays untouched.
+    """
+
+    def __init__(self, patchfile=None, batchsize=WRITEBACK_BATCHSIZE, fsync=True):
+        self.patchfile = Path(patchfile) if patchfile else None
+        self.batchsize = batchsize
+        self.fsync = fsync
+        self.written = 0
+        self.deleted = 0
+        self._writes = {}
+        self._deletes = []
+        # Files which were deleted by an applied batch, later writes of them are ignored
+        self._deleted = set()
+        self._patch = self.patchfile.open('w', encoding='utf-8') if self.patchfile else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, filename: Path, text: str, original: str) -> None:
+        """
+        Stages the new content of a file
+        :param filename: filename
+        :param text: new content
+        :param original: current content, which is needed for the patch file
+        :return:
+        """
+        if filename in self._deletes or filename in self._deleted:
+            return
+        if filename in self._writes:
+            original = self._writes[filename][1]
+        self._writes[filename] = (text, original)
+        if len(self._writes) + len(self._deletes) >= self.batchsize:
+            self.commit()
+
+    def delete(self, *filenames: Path) -> None:
+        """
+        Stages the deletion of files, staged writes of these files are discarded
+        :param filenames: filenames
+        :return:
+        """
+        for filename in filenames:
+            self._writes.pop(filename, None)
+            if filename not in self._deletes and filename not in self._deleted:
+                self._deletes.append(filename)
+        if len(self._writes) + len(self._deletes) >= self.batchsize:
+            self.commit()
+
+    def commit(self) -> None:
+        """
+        Applies the staged changes
+        :return:
+        """
+        if self._patch:
+            self._write_patch()
+        else:
+            self._write_files()
+        self.written += len(self._writes)
+        self.deleted += len(self._deletes)
+        self._deleted.update(self._deletes)
+        self._writes = {}
+        self._deletes = []
+
+    def _write_files(self) -> None:
+        directories = set()
+        tmpfiles = []
+        try:
+            for filename, (text, _) in self._writes.items():
+                fd, tmpname = tempfile.mkstemp(prefix=f".{filename.name}.", suffix='.tmp', dir=filename.parent)
+                tmpfiles.append((tmpname, filename))
+                with os.fdopen(fd, 'w', encoding='utf-8') as fout:
+                    fout.write(text)
+                    fout.flush()
+                    if self.fsync:
+                        os.fsync(fout.fileno())
+                shutil.copymode(filename, tmpname)
+            for tmpname, filename in tmpfiles:
+                os.replace(tmpname, filename)
+                directories.add(filename.parent)
+        finally:
+            for tmpname, _ in tmpfiles:
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+        for filename in self._deletes:
+            if filename.exists():
+                filename.unlink()
+                directories.add(filename.parent)
+        # One fsync per directory makes the renames and deletions of the batch durable
+        if self.fsync and hasattr(os, 'O_DIRECTORY'):
+            for directory in directories:
+                fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+    def _write_patch(self) -> None:
+        # Paths are relative to the working directory, so the patch applies with 'patch -p1'
+        for filename, (text, original) in self._writes.items():
+            relname = Path(os.path.relpath(filename)).as_posix()
+            self._patch.writelines(unified_diff(original, text, f"a/{relname}", f"b/{relname}"))
+        for filename in self._deletes:
+            relname = Path(os.path.relpath(filename)).as_posix()
+            if filename.suffix == '.txt' and filename.exists():
+                self._patch.writelines(unified_diff(filename.read_text(encoding='utf-8'), '',
+                                                    f"a/{relname}", "/dev/null"))
+            else:
+                self._patch.write(f"# Delete {relname}\n")
+        self._patch.flush()
+
+    def close(self) -> None:
+        self.commit()
+        if self._patch:
+            self._patch.close()
@@ -0,0 +1,80 @@
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+# Elements whose finished subtrees are cleared to keep the memory bounded
+CLEARED_ELEMENTS = {'TextRegion', 'TableRegion', 'TextBlock', 'ComposedBlock', 'Page', 'PrintSpace'}
+
+
+def _localname(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _page_textline(elem) -> str:
+    # Only the TextEquiv of the line itself counts, not the ones of its words and glyphs
+    textequivs = [child for child in elem if _localname(child.tag) == 'TextEquiv']
+    if not textequivs:
+        return ''
+    textequiv = min(textequivs, key=lambda textequiv: int(textequiv.get('index', 0)))
+    for child in textequiv:
+        if _localname(child.tag) == 'Unicode':
+            return child.text or ''
+    return ''
+
+
+def _alto_textline(elem) -> str:
+    parts = []
+    for child in elem:
+        tag = _localname(child.tag)
+        if tag == 'String':
+            # Strings without SP elements in between are separated by a space
+            if parts and not parts[-1].endswith(' '):
+                parts.append(' ')
+            parts.append(child.get('CONTENT', ''))
+        elif tag == 'SP' and parts:
+            parts.append(' ')
+        elif tag == 'HYP':
+            parts.append(child.get('CONTENT', ''))
+    return ''.join(parts).strip()
+
+
+def iter_xml_textlines(fname: Path):
+    """
+    Streams the textlines of a PAGE-XML or ALTO file, the finished lines and regions are cleared,
+    so the whole document is never held in memory
+    :param fname: filename
+    :return: tuples of line identifier and textline
+    """
+    try:
+        context = ET.iterparse(str(fname), events=('start', 'end'))
+        _, root = next(context)
+        xmlformat = _localname(root.tag)
+        if xmlformat not in ('PcGts', 'alto'):
+            raise ValueError(f"{fname} is neither a PAGE-XML nor an ALTO file")
+        textline, idattr = (_page_textline, 'id') if xmlformat == 'PcGts' else (_alto_textline, 'ID')
+        idx = 0
+        for event, elem in context:
+            if event != 'end':
+                continue
+            tag = _localname(elem.tag)
+            if tag == 'TextLine':
+                text = ' '.join(textline(elem).splitlines())
+                yield elem.get(idattr) or f"line_{idx}", text
+                idx += 1
+                elem.clear()
+            elif tag in CLEARED_ELEMENTS:
+                elem.clear()
+    except ET.ParseError as err:
+        raise ValueError(f"{fname} is not a valid xml file ({err})")
+
+
+def read_xml_textlines(fname: Path) -> tuple:
+    """
+    Reads the textlines of a PAGE-XML or ALTO file
+    :param fname: filename
+    :return: list of line identifiers ('{filename}#{line id}') and list of textlines
+    """
+    lineids, textlines = [], []
+    for lineid, textline in iter_xml_textlines(fname):
+        lineids.append(f"{fname.name}#{lineid}")
+        textlines.append(textline)
+    return lineids, textlines